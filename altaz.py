@@ -0,0 +1,129 @@
+import numpy as np
+
+from astropy.coordinates import SkyCoord, AltAz, TETE
+from astropy.time import Time
+from astropy import units
+
+# Ratio between sidereal and solar time, used to advance local sidereal time between samples
+SIDEREAL_RATE = 1.00273781191135448
+
+# Worst case difference between the fast and the astropy altitudes. Validated against the astropy path
+# at below 1 arcsecond for one night; the apparent place frozen at the window midpoint drifts by roughly
+# 1 arcsecond per day (annual aberration, precession), so multi-night windows stay well inside this bound.
+FAST_ENGINE_MAX_ERROR_ARCSEC = 60
+
+ALTAZ_ENGINES = ["astropy", "fast"]
+
+SAMPLE_BLOCK_MINUTES = 240
+
+
+def star_coordinates(ra_deg, dec_deg):
+    return SkyCoord(ra=np.asarray(ra_deg) * units.deg, dec=np.asarray(dec_deg) * units.deg, frame='icrs')
+
+
+class AstropyAltAzEngine:
+    # Full AltAz transform at every sample: precession, nutation, aberration and polar motion per minute
+    def altitudes(self, coordinates, observation_times, observer_location):
+        altaz_coordinates = coordinates.reshape(1, -1).transform_to(
+            AltAz(obstime=observation_times.reshape(-1, 1), location=observer_location))
+
+        return altaz_coordinates.alt.value
+
+    def sample_altitudes(self, coordinates, star_index, sample_minute, observation_times, observer_location):
+        # A transform with a distinct obstime per element redoes the time dependent work for every sample, so
+        # samples are grouped in blocks of minutes and each block is transformed as a small minutes x stars grid
+        # holding only the stars that have samples in it
+        altitudes = np.zeros(len(sample_minute))
+        sample_block = sample_minute // SAMPLE_BLOCK_MINUTES
+        for block in np.unique(sample_block):
+            in_block = np.flatnonzero(sample_block == block)
+            block_stars, star_column = np.unique(star_index[in_block], return_inverse=True)
+            block_minutes, minute_row = np.unique(sample_minute[in_block], return_inverse=True)
+
+            grid = self.altitudes(coordinates[block_stars], observation_times[block_minutes], observer_location)
+            altitudes[in_block] = grid[minute_row, star_column]
+
+        return altitudes
+
+    def apparent_places(self, coordinates, mid_time):
+        # The full transform depends on the site at every step, there is no site independent part to share
+        return coordinates
+
+    def sample_altitudes_from_apparent(self, apparent, star_index, sample_minute, observation_times,
+                                       observer_location):
+        return self.sample_altitudes(apparent, star_index, sample_minute, observation_times, observer_location)
+
+
+class FastAltAzEngine:
+    # Apparent place (precession, nutation, aberration) is computed once per star at the window midpoint,
+    # the altitude of every sample then follows from local sidereal time and hour angle.
+    # No refraction is applied, same as the astropy path without atmospheric pressure.
+    def altitudes(self, coordinates, observation_times, observer_location):
+        mid_time = middle_time(observation_times)
+        apparent = coordinates.transform_to(TETE(obstime=mid_time))
+        lst = self.local_sidereal_time(observation_times, mid_time, observer_location)
+
+        return self.altitudes_from_hour_angle(lst.reshape(-1, 1), apparent.ra.rad.reshape(1, -1),
+                                              apparent.dec.rad.reshape(1, -1), observer_location.lat.rad)
+
+    def sample_altitudes(self, coordinates, star_index, sample_minute, observation_times, observer_location):
+        apparent = self.apparent_places(coordinates, middle_time(observation_times[sample_minute]))
+
+        return self.sample_altitudes_from_apparent(apparent, star_index, sample_minute, observation_times,
+                                                   observer_location)
+
+    def apparent_places(self, coordinates, mid_time):
+        # Geocentric apparent place, the same for every site, so it is shared by the sites of a multi-site job
+        return coordinates.transform_to(TETE(obstime=mid_time))
+
+    def sample_altitudes_from_apparent(self, apparent, star_index, sample_minute, observation_times,
+                                       observer_location):
+        # Horizon step of one site: sidereal time and hour angle of the apparent places
+        sample_times = observation_times[sample_minute]
+        lst = self.local_sidereal_time(sample_times, middle_time(sample_times), observer_location)
+
+        return self.altitudes_from_hour_angle(lst, apparent.ra.rad[star_index], apparent.dec.rad[star_index],
+                                              observer_location.lat.rad)
+
+    def local_sidereal_time(self, observation_times, mid_time, observer_location):
+        lst_mid = mid_time.sidereal_time('apparent', longitude=observer_location.lon).rad
+        elapsed_days = (observation_times.jd1 - mid_time.jd1) + (observation_times.jd2 - mid_time.jd2)
+
+        return lst_mid + 2 * np.pi * SIDEREAL_RATE * elapsed_days
+
+    def altitudes_from_hour_angle(self, lst, ra, dec, lat):
+        hour_angle = lst - ra
+        sin_alt = np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(hour_angle)
+
+        return np.degrees(np.arcsin(np.clip(sin_alt, -1, 1)))
+
+
+def middle_time(observation_times):
+    jd = observation_times.jd
+    return Time((np.min(jd) + np.max(jd)) / 2, format='jd')
+
+
+def get_altaz_engine(name):
+    if name == "fast":
+        return FastAltAzEngine()
+    elif name == "astropy":
+        return AstropyAltAzEngine()
+
+    raise ValueError("Unknown alt/az engine: %s" % name)
+
+
+def validate_fast_engine(coordinates, observation_times, observer_location, sample_size=20, seed=0):
+    # Compares the fast engine with astropy on a random sample of stars, over the full time grid
+    sample_size = min(sample_size, len(coordinates))
+    sample = np.random.default_rng(seed).choice(len(coordinates), size=sample_size, replace=False)
+
+    fast = FastAltAzEngine().altitudes(coordinates[sample], observation_times, observer_location)
+    reference = AstropyAltAzEngine().altitudes(coordinates[sample], observation_times, observer_location)
+    errors = np.abs(fast - reference) * 3600
+
+    return {
+        "stars": sample_size,
+        "max_error_arcsec": float(np.max(errors, initial=0)),
+        "mean_error_arcsec": float(np.mean(errors)) if errors.size else 0.0,
+        "within_bound": bool(np.all(errors <= FAST_ENGINE_MAX_ERROR_ARCSEC))
+    }
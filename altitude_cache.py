@@ -0,0 +1,181 @@
+import hashlib
+import os
+import threading
+import uuid
+
+import numpy as np
+
+DEFAULT_ALTITUDE_CACHE_DIR = "altitude_cache"
+DEFAULT_ALTITUDE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+CACHE_FILE_SUFFIX = ".npz"
+
+
+def find_sorted(sorted_values, values):
+    # Returns (found mask, positions in sorted_values) for every value
+    if len(sorted_values) == 0:
+        return np.zeros(len(values), dtype=bool), np.zeros(len(values), dtype=np.int64)
+
+    positions = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[positions] == values, positions
+
+
+class AltitudeGrids:
+    # Altitudes known for one observer, night, catalog version and engine: the sun curve, full star curves
+    # (one float32 row per star id) and single in-transit samples keyed by star_id * minutes + minute.
+    # covers_visible_catalog is set once the samples of every transit of every star visible from the
+    # observer's latitude are included, whatever the magnitude or declination filters of the job.
+    def __init__(self, minutes, sun=None, row_ids=None, rows=None, point_keys=None, point_alts=None,
+                 covers_visible_catalog=False):
+        self.minutes = minutes
+        self.covers_visible_catalog = covers_visible_catalog
+        self.sun = sun
+        self.row_ids = np.zeros(0, dtype=np.int64) if row_ids is None else row_ids
+        self.rows = np.zeros((0, minutes), dtype=np.float32) if rows is None else rows
+        self.point_keys = np.zeros(0, dtype=np.int64) if point_keys is None else point_keys
+        self.point_alts = np.zeros(0, dtype=np.float32) if point_alts is None else point_alts
+        self.changed = False
+
+    def set_covers_visible_catalog(self):
+        self.covers_visible_catalog = True
+        self.changed = True
+
+    def set_sun(self, sun):
+        self.sun = np.asarray(sun, dtype=np.float64)
+        self.changed = True
+
+    def get_rows(self, star_ids):
+        # Returns (found mask, rows of the found stars)
+        found, positions = find_sorted(self.row_ids, np.asarray(star_ids, dtype=np.int64))
+
+        return found, self.rows[positions[found]]
+
+    def add_rows(self, star_ids, rows):
+        star_ids = np.asarray(star_ids, dtype=np.int64)
+        if len(star_ids) == 0:
+            return
+
+        row_ids = np.concatenate([self.row_ids, star_ids])
+        rows = np.concatenate([self.rows, np.asarray(rows, dtype=np.float32).reshape(len(star_ids), self.minutes)])
+        row_ids, unique_positions = np.unique(row_ids, return_index=True)
+
+        self.row_ids = row_ids
+        self.rows = rows[unique_positions]
+        self.changed = True
+
+    def get_samples(self, star_ids, sample_minutes):
+        # Returns (found mask, altitudes) for every (star, minute) pair, from full rows or single samples
+        star_ids = np.asarray(star_ids, dtype=np.int64)
+        sample_minutes = np.asarray(sample_minutes, dtype=np.int64)
+        altitudes = np.zeros(len(star_ids))
+
+        found_row, row_positions = find_sorted(self.row_ids, star_ids)
+        altitudes[found_row] = self.rows[row_positions[found_row], sample_minutes[found_row]]
+
+        found_point, point_positions = find_sorted(self.point_keys, star_ids * self.minutes + sample_minutes)
+        found_point &= ~found_row
+        altitudes[found_point] = self.point_alts[point_positions[found_point]]
+
+        return found_row | found_point, altitudes
+
+    def add_samples(self, star_ids, sample_minutes, altitudes):
+        if len(star_ids) == 0:
+            return
+
+        keys = np.asarray(star_ids, dtype=np.int64) * self.minutes + np.asarray(sample_minutes, dtype=np.int64)
+        point_keys, unique_positions = np.unique(np.concatenate([self.point_keys, keys]), return_index=True)
+        point_alts = np.concatenate([self.point_alts, np.asarray(altitudes, dtype=np.float32)])
+
+        self.point_keys = point_keys
+        self.point_alts = point_alts[unique_positions]
+        self.changed = True
+
+
+class AltitudeGridCache:
+    # Compressed .npz files of AltitudeGrids on disk. Files are written under a unique temporary name and
+    # renamed into place, so readers (other threads or app instances) never see a partial file. Least
+    # recently used files are removed when the directory grows over max_bytes.
+    def __init__(self, directory=DEFAULT_ALTITUDE_CACHE_DIR, max_bytes=DEFAULT_ALTITUDE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    def get_path(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + CACHE_FILE_SUFFIX)
+
+    def load(self, key, minutes):
+        path = self.get_path(key)
+        try:
+            with np.load(path) as data:
+                if int(data["minutes"]) != minutes:
+                    return AltitudeGrids(minutes)
+
+                grids = AltitudeGrids(minutes,
+                                      sun=data["sun"] if data["sun"].size else None,
+                                      row_ids=data["row_ids"], rows=data["rows"],
+                                      point_keys=data["point_keys"], point_alts=data["point_alts"],
+                                      covers_visible_catalog=bool(data["covers_visible_catalog"]))
+        except FileNotFoundError:
+            return AltitudeGrids(minutes)
+        except (OSError, ValueError, KeyError):
+            # Unreadable entry, drop it and start over
+            self.remove(path)
+            return AltitudeGrids(minutes)
+
+        # Mark as recently used for the eviction order
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return grids
+
+    def store(self, key, grids):
+        if not grids.changed:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.get_path(key)
+        tmp_path = "%s.%d.%s.tmp" % (path, os.getpid(), uuid.uuid4().hex)
+
+        sun = grids.sun if grids.sun is not None else np.zeros(0)
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(f, minutes=grids.minutes, sun=sun, row_ids=grids.row_ids, rows=grids.rows,
+                                    point_keys=grids.point_keys, point_alts=grids.point_alts,
+                                    covers_visible_catalog=grids.covers_visible_catalog)
+            os.replace(tmp_path, path)
+        finally:
+            self.remove(tmp_path)
+        grids.changed = False
+
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(CACHE_FILE_SUFFIX):
+                    continue
+
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total_bytes = sum(entry[1] for entry in entries)
+            for _, size, path in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+
+                self.remove(path)
+                total_bytes -= size
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,129 +1,303 @@
 import datetime
 import threading
-import time
-import math
 import numpy as np
 
-from astropy.coordinates import SkyCoord, AltAz, EarthLocation, get_sun
-from astropy.time import Time
-from astropy import units
-
 import pytz
-from timezonefinder import TimezoneFinder
-from utils import Timer
+from utils import Timer, mark_startup_phase
+from metrics import JobMetrics
+from catalog import Catalog, CatalogIndex
+from altitude_cache import AltitudeGridCache
+from result_cache import ResultCache, DEFAULT_RESULT_CACHE_SIZE, freeze
+from parallel_altaz import ParallelAltAzEngine, DEFAULT_ALTAZ_CHUNK_SIZE
+from transit_validation import validate_transits, any_valid_per_planet, interval_overlaps, possibly_valid_per_planet
+from ephemeris import datetime_to_jd, jd_to_minute_offsets, TransitEventIndex
+from results import TransitTable, ExoplanetResult, MultiSiteResult, pack_altitude_rows
+from sun import sun_altitudes, get_twilight_times, get_dark_intervals, SUN_MODEL_VERSION
+from visibility import max_altitudes, PRESCREEN_MARGIN_DEG
+
+DEFAULT_CATALOG_PATH = "transit_db.txt"
+# Nights around the last requested ones that are computed ahead while the backend is idle
+DEFAULT_PREFETCH_NIGHTS = 3
+RECENT_ALTITUDE_GRIDS = 8
+# Size of the first batch of candidates streamed to the frontend, the following ones double up to the max
+FIRST_RESULT_BATCH_SIZE = 8
+MAX_RESULT_BATCH_SIZE = 256
+# Progress of a night when the stages before validation are done. Validation then advances with the candidates
+# processed up to VALIDATION_PROGRESS_END, and sampling the rest of the visible catalog takes the remainder.
+STAGE_PROGRESS = {"sun graph": 0.05, "filter": 0.1, "transit search": 0.15}
+VALIDATION_PROGRESS_END = 0.9
+# Stars transformed between two cancellation checkpoints of an altitude pass, and stars of the visible catalog
+# looked up between two checkpoints of its sampling pass
+ALTITUDE_PASS_CHUNK_STARS = 512
+VISIBLE_CATALOG_CHUNK_STARS = 8192
+
+class JobCancelled(Exception):
+    pass
 
 class BackendThread(threading.Thread):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, result_cache_size=DEFAULT_RESULT_CACHE_SIZE, prefetch_nights=DEFAULT_PREFETCH_NIGHTS,
+                 altitude_cache=None, altaz_workers=1, altaz_chunk_size=DEFAULT_ALTAZ_CHUNK_SIZE,
+                 catalog_path=DEFAULT_CATALOG_PATH, metrics_log=None, **kwargs):
         super(BackendThread, self).__init__(*args, **kwargs)
         self.frontend_thread = None
+        self.catalog_path = catalog_path
         self.exoplanet_db = []
+        self.transit_index = None
+        self.catalog_coordinates = None
         self.job = None
+        self.last_job_id = 0
 
+        # Signalled whenever a job is requested or the thread is asked to stop
         self.job_lock = threading.Lock()
+        self.job_condition = threading.Condition(self.job_lock)
 
-        self.start_time = 0
-        self.stats = {}
+        # Metrics of the job in flight, appended to the metrics_log file (if any) when it ends
+        self.metrics = JobMetrics()
+        self.metrics_log = metrics_log
         self.kill_signal = False
 
-        self.timezone_finder = TimezoneFinder()
+        self.result_cache = ResultCache(result_cache_size)
+        self.altitude_cache = altitude_cache if altitude_cache is not None else AltitudeGridCache()
+        # Altitudes of the last nights, kept in memory so filter only changes skip the disk cache as well
+        self.recent_altitude_grids = ResultCache(RECENT_ALTITUDE_GRIDS)
+
+        # More than one worker shards the altitude computation over a process pool
+        self.altaz_workers = altaz_workers
+        self.altaz_chunk_size = altaz_chunk_size
+        self.parallel_altaz_engines = {}
+        self.prefetch_nights = prefetch_nights
+        self.prefetch_jobs = []
+
+        # Astropy and the timezone data are loaded on the backend thread, see warm_up
+        self.timezone_finder = None
+        self.observer_timezones = {}
 
     def set_frontend_thread(self, frontend_thread):
         self.frontend_thread = frontend_thread
 
     def read_database(self):
-        f = open("transit_db.txt", "r")
-        lines = f.readlines()
-        for i in range(0, len(lines), 3):
-            star = lines[i].split(',')[0].strip()
-            planet = lines[i].split(',')[1].strip()
-            ra = list(map(float, lines[i + 1].split(', ')[0].split(' ')))
-            dec = list(map(float, lines[i + 1].split(', ')[1].split(' ')))
-
-            mag = float(lines[i + 1].split(', ')[2])
-            transit_dv = float(lines[i + 1].split(', ')[3])
-            duration = float(lines[i + 1].split(', ')[4])
-
-            period = float(lines[i + 1].split(', ')[5])
-            t0 = float(lines[i + 1].split(', ')[6])
-
-            self.exoplanet_db.append({
-                "star": star,
-                "planet": planet,
-                "ra": ra,
-                "dec": dec,
-                "mag": mag,
-                "transit_dv": transit_dv,
-                "duration": duration,
-                "period": period,
-                "T0": t0
-            })
+        self.exoplanet_db = Catalog.open(self.catalog_path)
+        self.transit_index = TransitEventIndex(self.exoplanet_db)
+        self.catalog_index = CatalogIndex(self.exoplanet_db)
+        self.catalog_coordinates = None
+
+    def warm_up(self):
+        # Heavy imports are kept out of the startup path, they are loaded here while the window is shown
+        with Timer("Backend warm up"):
+            import altaz
+            self.get_timezone_finder()
+        mark_startup_phase("Backend ready")
 
     def run(self):
         self.read_database()
+        self.warm_up()
 
         while True:
-            time.sleep(0.1)
-
-            job = self.get_requested_job()
-            if job is not None:
-                result = self.execute_job(self.job)
-                self.frontend_thread.on_backend_job_done(result)
-                self.clear_requested_job()
-
+            job = self.wait_for_job()
             if self.kill_signal:
                 break
 
-    def request_kill(self):
-        self.kill_signal = True
+            try:
+                if job is not None:
+                    self.execute_job(job, self.frontend_thread.on_backend_job_done)
+                    self.schedule_prefetch(job)
+                else:
+                    # One night at a time, a new request also cancels the prefetched night in flight
+                    self.prefetch_next()
+            except JobCancelled:
+                if job is not None:
+                    print("Job %d cancelled, a newer one was requested" % job["job_id"])
 
-    def request_job(self, request):
-        with self.job_lock:
-            if self.job is not None:
-                return False
+        for engine in self.parallel_altaz_engines.values():
+            engine.shutdown()
 
-            self.job = request
-            return True
+    def request_kill(self):
+        with self.job_condition:
+            self.kill_signal = True
+            self.job_condition.notify()
 
-    def get_requested_job(self):
-        with self.job_lock:
-            return self.job
+    def request_job(self, request):
+        # A new request replaces the pending one, and the job in flight stops at its next checkpoint.
+        # Returns the id that the results of this request will carry.
+        with self.job_condition:
+            self.last_job_id += 1
+            self.job = dict(request)
+            self.job["job_id"] = self.last_job_id
+            self.job_condition.notify()
+
+            return self.last_job_id
+
+    def wait_for_job(self):
+        # Returns the next requested job, or None when there is prefetching to do
+        with self.job_condition:
+            while self.job is None and len(self.prefetch_jobs) == 0 and not self.kill_signal:
+                self.job_condition.wait()
+
+            job = self.job
+            self.job = None
+            return job
 
-    def clear_requested_job(self):
+    def check_cancelled(self):
+        # Checkpoint between pipeline stages
         with self.job_lock:
-            self.job = None
+            if self.job is not None or self.kill_signal:
+                raise JobCancelled()
 
-    def job_started(self):
-        self.start_time = time.time()
-        self.stats = {}
+    def job_started(self, job, kind="job"):
+        self.metrics = JobMetrics(job.get("job_id"), kind)
 
-    def job_ended(self):
-        duration = time.time() - self.start_time
-        print("Job took: %.2f seconds" % duration)
-        print("Stats:")
-        for key in self.stats:
-            print("%s: %d" % (key, self.stats[key]))
+    def job_ended(self, cancelled=False):
+        self.metrics.finish(cancelled)
+        print(self.metrics.format_report())
+        if self.metrics_log is not None:
+            self.metrics.append_to_log(self.metrics_log)
 
     def add_stat(self, key, value):
-        if key not in self.stats:
-            self.stats[key] = 0
+        self.metrics.add_count(key, value)
+
+    def execute_job(self, job, on_results):
+        # Multi night jobs are computed one night at a time, so memory stays bounded by a single night.
+        # Results are handed to on_results as they are validated, in batches, followed by a closing
+        # message for every night (night_done). Progress only messages carry no exoplanets.
+        self.job_started(job)
+
+        try:
+            night_jobs = self.split_job_nights(job)
+            for night_index in range(0, len(night_jobs)):
+                self.check_cancelled()
+
+                def on_batch(batch_result, night_progress):
+                    batch_result["job_id"] = job.get("job_id")
+                    batch_result["night_index"] = night_index
+                    batch_result["night_count"] = len(night_jobs)
+                    batch_result["night_done"] = False
+                    batch_result["night_progress"] = night_progress
+                    on_results(batch_result)
+
+                result, streamed = self.get_night_result(night_jobs[night_index], on_batch)
+
+                # The closing message of a night only carries the results that were not streamed in batches
+                result = dict(result)
+                if streamed:
+                    result["exoplanets"] = []
+                result["job_id"] = job.get("job_id")
+                result["night_index"] = night_index
+                result["night_count"] = len(night_jobs)
+                result["night_done"] = True
+                result["night_progress"] = 1.0
+                result["stage"] = "done"
+                on_results(result)
+        except JobCancelled:
+            self.job_ended(cancelled=True)
+            raise
+
+        self.job_ended()
 
-        self.stats[key] += value
+    def execute_multi_site_job(self, job, on_results):
+        # Same as execute_job for a job with a list of "observers" instead of one observer. Every night is
+        # searched for all sites in one pass, on_results gets one message per night.
+        self.job_started(job, kind="multi-site")
+
+        try:
+            night_jobs = self.split_job_nights(job)
+            for night_index in range(0, len(night_jobs)):
+                self.check_cancelled()
+
+                result = self.execute_multi_site_night(night_jobs[night_index])
+                result["job_id"] = job.get("job_id")
+                result["night_index"] = night_index
+                result["night_count"] = len(night_jobs)
+                result["night_done"] = True
+                result["night_progress"] = 1.0
+                on_results(result)
+        except JobCancelled:
+            self.job_ended(cancelled=True)
+            raise
 
-    def execute_job(self, job):
-        self.job_started()
-        result = self.execute_job_internal(job)
         self.job_ended()
 
-        return result
+    def get_night_result(self, night_job, on_batch):
+        # Returns the night result and whether its exoplanets were already streamed through on_batch
+        key = self.get_result_cache_key(night_job)
+        result = self.result_cache.get(key)
+        if result is not None:
+            self.add_stat("Result cache hits", 1)
+            return result, False
+
+        result = self.execute_job_internal(night_job, on_batch)
+        self.result_cache.put(key, result)
+
+        return result, True
+
+    def get_result_cache_key(self, night_job):
+        # Any start time during the same local day maps to the same night
+        night_start_utc = self.timezone_transform(night_job["start_date"], night_job["observer"])
+
+        return (freeze(night_job["observer"]), night_start_utc, freeze(night_job["filters"]),
+                night_job.get("altaz_engine", "astropy"))
+
+    def schedule_prefetch(self, job):
+        # Nights closest to the requested range first: +1, -1, +2, -2, ...
+        nights = max(1, round((job["end_date"] - job["start_date"]) / datetime.timedelta(days=1)))
+
+        self.prefetch_jobs = []
+        for distance in range(1, self.prefetch_nights + 1):
+            for start_date in [job["start_date"] + datetime.timedelta(days=nights - 1 + distance),
+                               job["start_date"] - datetime.timedelta(days=distance)]:
+                night_job = dict(job)
+                night_job["start_date"] = start_date
+                night_job["end_date"] = start_date + datetime.timedelta(days=1)
+                night_job["validate_altaz_engine"] = False
+                self.prefetch_jobs.append(night_job)
+
+    def prefetch_next(self):
+        night_job = self.prefetch_jobs.pop(0)
+        key = self.get_result_cache_key(night_job)
+        if key not in self.result_cache:
+            self.job_started(night_job, kind="prefetch")
+            try:
+                self.result_cache.put(key, self.execute_job_internal(night_job))
+            except JobCancelled:
+                self.job_ended(cancelled=True)
+                raise
+            self.job_ended()
+
+    def split_job_nights(self, job):
+        nights = max(1, round((job["end_date"] - job["start_date"]) / datetime.timedelta(days=1)))
+
+        night_jobs = []
+        for night in range(0, nights):
+            night_job = dict(job)
+            night_job["start_date"] = job["start_date"] + datetime.timedelta(days=night)
+            night_job["end_date"] = night_job["start_date"] + datetime.timedelta(days=1)
+            night_jobs.append(night_job)
+
+        return night_jobs
+
+    def get_timezone_finder(self):
+        if self.timezone_finder is None:
+            from timezonefinder import TimezoneFinder
+            self.timezone_finder = TimezoneFinder()
+
+        return self.timezone_finder
 
     def get_observer_timezone(self, observer_data):
-        local_tz = pytz.timezone(self.timezone_finder.timezone_at(lng=observer_data["lon"], lat=observer_data["lat"]))
+        # Looked up several times per job for the same observer
+        key = (observer_data["lat"], observer_data["lon"])
+        if key not in self.observer_timezones:
+            self.observer_timezones[key] = pytz.timezone(
+                self.get_timezone_finder().timezone_at(lng=observer_data["lon"], lat=observer_data["lat"]))
 
-        return local_tz
+        return self.observer_timezones[key]
 
     def timezone_transform(self, date, observer_data):
         local_tz = self.get_observer_timezone(observer_data)
-        local_date = date.astimezone(local_tz).replace(hour=12, minute=0, second=0, microsecond=0)
+        if isinstance(date, datetime.datetime):
+            local_date = date.astimezone(local_tz).replace(hour=12, minute=0, second=0, microsecond=0)
+        else:
+            # A calendar date without a time of day is that date in the observer timezone, so every observer of a
+            # job gets the night of the same local date
+            local_date = local_tz.localize(datetime.datetime.combine(date, datetime.time(12)))
 
         # For UTC date we convert it to UTC to apply the timedelta, and after we remove the tzinfo
         # becase we need it as a naive date in further calculations
@@ -131,103 +305,365 @@ class BackendThread(threading.Thread):
 
         return utc_date
 
-    def execute_job_internal(self, job):
+    def execute_job_internal(self, job, on_batch=None):
         start_date_utc = self.timezone_transform(job["start_date"], job["observer"])
         end_date_utc = self.timezone_transform(job["end_date"], job["observer"])
 
-        start_hjd = Time(start_date_utc, format='datetime').jd
-        end_hjd = Time(end_date_utc, format='datetime').jd
+        start_hjd = datetime_to_jd(start_date_utc)
+        end_hjd = datetime_to_jd(end_date_utc)
 
         exoplanets = []
 
-        sun_alt_graph = self.get_sun_alt_graph(job)
-
-        exoplanets_to_plot = []
-        exoplanet_transits = []
-        for exoplanet in self.exoplanet_db:
-            if not self.apply_exoplanet_filters(exoplanet, job["observer"], job["filters"]):
-                self.add_stat("Exoplanets Reject by star", 1)
-                continue
+        def report_progress(stage, night_progress):
+            if on_batch is not None:
+                on_batch({"exoplanets": [], "stage": stage}, night_progress)
+
+        # Altitudes computed for this observer and night by earlier runs are reused from the disk cache
+        altitude_cache_key = self.get_altitude_cache_key(job, start_date_utc)
+        with self.metrics.stage("altitude cache"):
+            altitude_grids = self.load_altitude_grids(altitude_cache_key,
+                                                      self.get_night_minutes(start_date_utc, end_date_utc))
+
+        # A cancelled job keeps what it computed in the recent grids, which are written to the disk cache by the
+        # next job for the night, so the job that cancelled it does not wait for the write
+        try:
+            with self.metrics.stage("sun graph"):
+                sun_alt_graph = self.get_cached_sun_alt_graph(job, altitude_grids)
+                self.metrics.add_items("sun graph", len(sun_alt_graph["y"]))
+            self.check_cancelled()
+            report_progress("sun graph", STAGE_PROGRESS["sun graph"])
+
+            # The minute axis of the sun graph is shared by the altitude rows of every planet of the night
+            night_result = {"exoplanets": exoplanets, "sun_alt_graph": sun_alt_graph,
+                            "time_axis": sun_alt_graph["x"], "start_date": start_date_utc, "end_date": end_date_utc,
+                            "observer_timezone": self.get_observer_timezone(job["observer"]),
+                            "observer": job["observer"]}
+
+            with self.metrics.stage("filter", items=len(self.exoplanet_db)):
+                candidates = self.select_candidates(job, sun_alt_graph, start_date_utc)
+            report_progress("filter", STAGE_PROGRESS["filter"])
+
+            with self.metrics.stage("transit search", items=len(candidates)):
+                exoplanets_to_plot, transit_table = self.find_transits(candidates, start_hjd, end_hjd,
+                                                                       start_date_utc)
+            with self.metrics.stage("filter"):
+                keep = self.prune_by_night_window(exoplanets_to_plot, transit_table, job, sun_alt_graph,
+                                                  start_date_utc, end_date_utc)
+                kept_planets = np.unique(transit_table.planet[keep])
+                self.add_stat("Exoplanets pruned by night window", len(exoplanets_to_plot) - len(kept_planets))
+                exoplanets_to_plot = [exoplanets_to_plot[ex_id] for ex_id in kept_planets]
+                transit_table = transit_table.select(kept_planets)
+            report_progress("transit search", STAGE_PROGRESS["transit search"])
+
+            # Candidates are processed in result order, in batches that grow from a small first one, so the
+            # first results can be shown early while batch overhead stays low for the rest of the night
+            with self.metrics.stage("sort", items=len(exoplanets_to_plot)):
+                order = self.sort_exoplanets(list(range(0, len(exoplanets_to_plot))), job["filters"]["order"],
+                                             key=lambda ex_id: exoplanets_to_plot[ex_id])
+
+            # Altitudes are computed in passes ahead of the batches, which then validate and assemble the results.
+            # The fast engine evaluates the in-transit minutes of every candidate in one pass. Full-grid engines
+            # cost mostly per pass rather than per star: until the first results are shown (and while batches
+            # are still growing) every batch gets a small pass of its own, then one pass covers the rest.
+            pass_end = 0
+
+            batch_start = 0
+            batch_size = FIRST_RESULT_BATCH_SIZE
+            while batch_start < len(order):
+                if batch_start >= pass_end:
+                    if len(exoplanets) == 0 and batch_size < MAX_RESULT_BATCH_SIZE:
+                        pass_end = batch_start + batch_size
+                    else:
+                        pass_end = len(order)
+                    pass_ids = order[batch_start:pass_end]
+                    self.prepare_candidate_altitudes([exoplanets_to_plot[ex_id] for ex_id in pass_ids],
+                                                     transit_table.select(pass_ids), job, altitude_grids,
+                                                     start_date_utc, end_date_utc)
+                    self.check_cancelled()
+
+                batch = order[batch_start:batch_start + batch_size]
+                batch_exoplanets = self.validate_candidate_batch([exoplanets_to_plot[ex_id] for ex_id in batch],
+                                                                 transit_table.select(batch), job, sun_alt_graph,
+                                                                 altitude_grids, start_date_utc, end_date_utc)
+                exoplanets.extend(batch_exoplanets)
+
+                batch_start += len(batch)
+                batch_size = min(batch_size * 2, MAX_RESULT_BATCH_SIZE)
+                if on_batch is not None:
+                    night_progress = STAGE_PROGRESS["transit search"] + (
+                        VALIDATION_PROGRESS_END - STAGE_PROGRESS["transit search"]) * batch_start / len(order)
+                    on_batch(dict(night_result, exoplanets=batch_exoplanets, stage="validation"), night_progress)
+                self.check_cancelled()
+
+            # Rows of the streamed batches are gathered in one block, which is what the result cache retains
+            pack_altitude_rows(exoplanets, len(sun_alt_graph["x"]))
+
+            # The first job of a night also samples every star visible from the latitude, so later jobs for the
+            # same night that only change filters are answered from the retained altitudes
+            if not altitude_grids.covers_visible_catalog:
+                report_progress("visible catalog", VALIDATION_PROGRESS_END)
+                self.sample_visible_catalog(job, altitude_grids, start_date_utc, end_date_utc, start_hjd, end_hjd)
+        except JobCancelled:
+            self.recent_altitude_grids.put(altitude_cache_key, altitude_grids)
+            raise
+
+        with self.metrics.stage("altitude cache"):
+            self.altitude_cache.store(altitude_cache_key, altitude_grids)
+            self.recent_altitude_grids.put(altitude_cache_key, altitude_grids)
 
-            self.add_stat("Exoplanets Analyzed", 1)
-
-            x = start_hjd - exoplanet['T0']
-            jd_duration = exoplanet["duration"] / 1440
-            transits_since_t0 = math.floor(x / exoplanet['period'])
-            last_transit_start = transits_since_t0 * exoplanet['period'] + exoplanet['T0'] - jd_duration / 2
-
-            transits = []
-            while last_transit_start < end_hjd:
-                if last_transit_start + jd_duration > start_hjd:
-                    transits.append({"start": Time(last_transit_start, format="jd").to_datetime(),
-                                     "end": Time(last_transit_start + jd_duration, format="jd").to_datetime(),
-                                     "valid": True})
-
-                last_transit_start = last_transit_start + exoplanet["period"]
-
-            if len(transits) == 0:
-                continue
-
-            exoplanets_to_plot.append(exoplanet)
-            exoplanet_transits.append(transits)
+        print("Backend job done")
 
-        plot_graphs = self.generate_altitude_graphs(exoplanets_to_plot, job)
+        return night_result
+
+    def execute_multi_site_night(self, job):
+        # Catalog filtering, the transit search and, with the fast engine, the apparent places of the stars are
+        # computed once for all sites, only the sun, the horizon step and the validation run per site. The
+        # astropy transform depends on the site at every step, it runs in full per site. Every site keeps its own
+        # night (local noon to noon), transits are searched over the union of these windows.
+        filters = job["filters"]
+        site_jobs = [dict(job, observer=observer) for observer in job["observers"]]
+        site_windows = [(self.timezone_transform(job["start_date"], observer),
+                         self.timezone_transform(job["end_date"], observer)) for observer in job["observers"]]
+
+        with self.metrics.stage("sun graph", items=len(site_jobs)):
+            sun_alt_graphs = [self.get_sun_alt_graph(site_job) for site_job in site_jobs]
+        self.check_cancelled()
+
+        with self.metrics.stage("filter", items=len(self.exoplanet_db) * len(site_jobs)):
+            site_candidate_ids = [self.select_candidate_ids(site_jobs[site], sun_alt_graphs[site],
+                                                            site_windows[site][0])
+                                  for site in range(0, len(site_jobs))]
+            candidate_ids = np.unique(np.concatenate(site_candidate_ids))
+
+        union_start = min(window[0] for window in site_windows)
+        union_end = max(window[1] for window in site_windows)
+        with self.metrics.stage("transit search", items=len(candidate_ids)):
+            planets, transit_table = self.find_transits([self.exoplanet_db[int(star_id)] for star_id in candidate_ids],
+                                                        datetime_to_jd(union_start), datetime_to_jd(union_end),
+                                                        union_start)
+        planet_ids = np.array([planet["id"] for planet in planets], dtype=np.int64)
+        self.check_cancelled()
+
+        # Transits of every site: those of its candidates inside its night that can be in the dark long enough
+        site_transits = []
+        with self.metrics.stage("filter"):
+            for site in range(0, len(site_jobs)):
+                start_jd, end_jd = datetime_to_jd(site_windows[site][0]), datetime_to_jd(site_windows[site][1])
+                in_window = np.flatnonzero(np.isin(planet_ids[transit_table.planet], site_candidate_ids[site]) &
+                                           (transit_table.start_jds < end_jd) & (transit_table.end_jds > start_jd))
+                site_table = TransitTable(transit_table.planet[in_window], transit_table.start_jds[in_window],
+                                          transit_table.end_jds[in_window],
+                                          jd_to_minute_offsets(transit_table.start_jds[in_window],
+                                                               site_windows[site][0]),
+                                          jd_to_minute_offsets(transit_table.end_jds[in_window],
+                                                               site_windows[site][0]))
+
+                keep = self.prune_by_night_window(planets, site_table, site_jobs[site], sun_alt_graphs[site],
+                                                  *site_windows[site])
+                self.add_stat("Transits pruned by night window", int(np.sum(~keep)))
+                site_transits.append((in_window[keep], site_table.take(keep)))
+
+        # Apparent places of every star that any site has to look at, at the middle of the union window
+        sampled = np.unique(np.concatenate([table.planet for _, table in site_transits]))
+        star_position = np.full(len(planets), -1, dtype=np.int64)
+        star_position[sampled] = np.arange(len(sampled))
+
+        from astropy.time import Time
+        from altaz import get_altaz_engine
+        engine = get_altaz_engine(job.get("altaz_engine", "astropy"))
+        apparent = None
+        if len(sampled) > 0:
+            with self.metrics.stage("star altaz", items=len(sampled)):
+                apparent = engine.apparent_places(self.get_star_coordinates([planets[i] for i in sampled]),
+                                                  Time((datetime_to_jd(union_start) + datetime_to_jd(union_end)) / 2,
+                                                       format="jd"))
+
+        site_valid = np.zeros((len(transit_table), len(site_jobs)), dtype=bool)
+        site_observable_fraction = np.zeros((len(transit_table), len(site_jobs)))
+        for site in range(0, len(site_jobs)):
+            self.check_cancelled()
+            positions, table = site_transits[site]
+            ranges = self.get_transit_sample_ranges(planets, table, *site_windows[site])
+            sample_star, sample_minute = self.expand_transit_samples(ranges)
+
+            with self.metrics.stage("star altaz", items=len(sample_minute)):
+                sample_altitudes = np.zeros(0)
+                if len(sample_minute) > 0:
+                    sample_altitudes = engine.sample_altitudes_from_apparent(
+                        apparent, star_position[sample_star], sample_minute, self.get_observation_times(site_jobs[site]),
+                        self.get_observer_location(site_jobs[site]))
+            self.add_stat("Altitude samples calculated", len(sample_minute))
+
+            with self.metrics.stage("validation", items=len(table)):
+                valid, observable_fraction = validate_transits(sample_altitudes,
+                                                               sun_alt_graphs[site]["y"][sample_minute],
+                                                               ranges[:, 2], ranges[:, 3],
+                                                               filters.get("min_altitude", 0),
+                                                               filters.get("sun_max_altitude", 90),
+                                                               filters.get("min_observable_fraction", 1.0))
+                site_valid[positions, site] = valid
+                site_observable_fraction[positions, site] = observable_fraction
+
+        # Planets with a transit observable from any site, with all their transits in the night of any site
+        with self.metrics.stage("sort"):
+            accepted = np.flatnonzero(any_valid_per_planet(transit_table.planet, np.any(site_valid, axis=1),
+                                                           len(planets)))
+            order = self.sort_exoplanets(list(accepted), filters["order"], key=lambda ex_id: planets[ex_id])
+
+            transit_firsts = np.searchsorted(transit_table.planet, order, side="left")
+            transit_ends = np.searchsorted(transit_table.planet, order, side="right")
+            exoplanets = []
+            for result_id in range(0, len(order)):
+                transits = slice(transit_firsts[result_id], transit_ends[result_id])
+                exoplanets.append(MultiSiteResult(planets[order[result_id]], transit_table.start_jds[transits],
+                                                  transit_table.end_jds[transits], site_valid[transits],
+                                                  site_observable_fraction[transits],
+                                                  self.get_sort_key(planets[order[result_id]], filters["order"])))
+        self.add_stat("Exoplanet Added", len(exoplanets))
+
+        return {"exoplanets": exoplanets, "observers": job["observers"], "site_windows": site_windows,
+                "sun_alt_graphs": sun_alt_graphs, "start_date": union_start, "end_date": union_end}
+
+    def prune_by_night_window(self, exoplanets, transit_table, job, sun_alt_graph, start_date_utc, end_date_utc):
+        # Transit minutes outside the dark intervals of the night cannot be observable whatever the star altitude.
+        # Returns a mask over the transits of transit_table that keeps the transits of the planets with a possibly
+        # valid one, the others are dropped before any star coordinates are transformed.
+        if len(transit_table) == 0:
+            return np.zeros(0, dtype=bool)
+
+        ranges = self.get_transit_sample_ranges(exoplanets, transit_table, start_date_utc, end_date_utc)
+        transit_planet = ranges[:, 0]
+        first_minute = ranges[:, 1]
+        sample_counts = ranges[:, 3] - ranges[:, 2]
+
+        dark_starts, dark_ends = get_dark_intervals(sun_alt_graph["y"], job["filters"].get("sun_max_altitude", 90))
+        dark_counts = interval_overlaps(first_minute, first_minute + sample_counts, dark_starts, dark_ends)
+
+        possible = possibly_valid_per_planet(transit_planet, dark_counts, sample_counts, len(exoplanets),
+                                             job["filters"].get("min_observable_fraction", 1.0))
+
+        return possible[transit_table.planet]
+
+    def prepare_candidate_altitudes(self, exoplanets, transit_table, job, altitude_grids, start_date_utc,
+                                    end_date_utc):
+        # Adds what validating the candidates needs to the altitude grids: their rows over the whole night with
+        # a full-grid engine, their in-transit samples otherwise
+        if self.uses_full_grid(job):
+            self.get_cached_altitude_rows(exoplanets, job, altitude_grids)
+        else:
+            sample_star, sample_minute = self.expand_transit_samples(
+                self.get_transit_sample_ranges(exoplanets, transit_table, start_date_utc, end_date_utc))
+            self.get_cached_sample_altitudes(exoplanets, sample_star, sample_minute, job, altitude_grids)
+
+    def validate_candidate_batch(self, exoplanets_to_plot, transit_table, job, sun_alt_graph, altitude_grids,
+                                 start_date_utc, end_date_utc):
+        with self.metrics.stage("validation"):
+            return self.validate_candidates(exoplanets_to_plot, transit_table, job, sun_alt_graph,
+                                            altitude_grids, start_date_utc, end_date_utc)
+
+    def validate_candidates(self, exoplanets_to_plot, transit_table, job, sun_alt_graph, altitude_grids,
+                            start_date_utc, end_date_utc):
+        # The altitudes were added to the grids by prepare_candidate_altitudes, they are read from there
+        transit_samples = self.get_transit_sample_ranges(exoplanets_to_plot, transit_table,
+                                                         start_date_utc, end_date_utc)
+        sample_star, sample_minute = self.expand_transit_samples(transit_samples)
+        sample_altitudes = self.get_cached_sample_altitudes(exoplanets_to_plot, sample_star, sample_minute, job,
+                                                            altitude_grids)
+
+        transit_planet, _, sample_starts, sample_ends = transit_samples.T
+        valid, observable_fraction = validate_transits(sample_altitudes, sun_alt_graph["y"][sample_minute],
+                                                       sample_starts, sample_ends,
+                                                       job["filters"].get("min_altitude", 0),
+                                                       job["filters"].get("sun_max_altitude", 90),
+                                                       job["filters"].get("min_observable_fraction", 1.0))
+
+        self.metrics.add_items("validation", len(transit_table))
+
+        accepted = np.flatnonzero(any_valid_per_planet(transit_planet, valid, len(exoplanets_to_plot)))
+        self.check_cancelled()
+
+        # Full night curves are only needed by the planets that are shown
+        with self.metrics.stage("plot", items=len(accepted)):
+            plot_rows = self.get_cached_altitude_rows([exoplanets_to_plot[ex_id] for ex_id in accepted], job,
+                                                      altitude_grids)
+
+            # Transits of a planet are consecutive in the table
+            transit_firsts = np.searchsorted(transit_table.planet, accepted, side="left")
+            transit_ends = np.searchsorted(transit_table.planet, accepted, side="right")
+
+            exoplanets = []
+            for plot_id in range(0, len(accepted)):
+                ex_id = accepted[plot_id]
+                transits = slice(transit_firsts[plot_id], transit_ends[plot_id])
+                self.add_stat("Exoplanet plots calculated", 1)
+                self.add_stat("Exoplanet Added", 1)
+                exoplanets.append(ExoplanetResult(exoplanets_to_plot[ex_id],
+                                                  transit_table.start_minutes[transits],
+                                                  transit_table.end_minutes[transits],
+                                                  transit_table.start_jds[transits], transit_table.end_jds[transits],
+                                                  valid[transits], observable_fraction[transits], plot_rows[plot_id],
+                                                  self.get_sort_key(exoplanets_to_plot[ex_id],
+                                                                    job["filters"]["order"])))
 
-        for ex_id in range(0, len(exoplanets_to_plot)):
-            # compute alt graph
-            alt_graph = plot_graphs[ex_id]
-            transits = exoplanet_transits[ex_id]
-            exoplanet = exoplanets_to_plot[ex_id]
-            self.add_stat("Exoplanet plots calculated", 1)
+        return exoplanets
 
-            has_valid_transits = False
-            for transit in transits:
-                start_min = int((transit["start"] - start_date_utc).total_seconds() / 60)
-                duration_mins = int(exoplanet["duration"])
+    def find_transits(self, candidates, start_hjd, end_hjd, start_date_utc):
+        # Returns the candidates with transits in the window and their transits, as a TransitTable
+        candidate_ids = np.array([exoplanet["id"] for exoplanet in candidates], dtype=np.int64)
+        planet_index, transit_starts, transit_ends, fallback_index = self.transit_index.query(candidate_ids,
+                                                                                             start_hjd, end_hjd)
+        self.add_stat("Transit index fallbacks", len(fallback_index))
 
-                end_min = int((transit["end"] - start_date_utc).total_seconds() / 60)
-                end_min = min(end_min, int((end_date_utc - start_date_utc).total_seconds() / 60))
+        # Transits are grouped by candidate, they are renumbered to the candidates that have any
+        with_transits, transit_planet = np.unique(planet_index, return_inverse=True)
 
-                max_sun_alt = job["filters"].get("sun_max_altitude", 90)
+        return ([candidates[candidate] for candidate in with_transits],
+                TransitTable.from_jds(transit_planet.reshape(-1), transit_starts, transit_ends, start_date_utc))
 
-                for i in range(max(start_min, 0), min(end_min, start_min + duration_mins)):
-                    if alt_graph["y"][i] < job["filters"].get("min_altitude", 0):
-                        transit["valid"] = False
-                        break
+    def get_transit_sample_ranges(self, exoplanets, transit_table, start_date_utc, end_date_utc):
+        # For every transit, in planet order, a row of (planet index, first minute, first sample, end sample),
+        # where samples are the in-transit minutes inside the job window
+        total_mins = int((end_date_utc - start_date_utc).total_seconds() / 60)
 
-                    if sun_alt_graph["y"][i] > max_sun_alt:
-                        transit["valid"] = False
-                        break
+        duration_mins = np.array([exoplanet["duration"] for exoplanet in exoplanets],
+                                 dtype=np.float64).astype(np.int64)[transit_table.planet]
+        start_min = transit_table.start_minutes
+        end_min = np.minimum(np.minimum(transit_table.end_minutes, total_mins), start_min + duration_mins)
 
-                if transit["valid"]:
-                    has_valid_transits = True
+        first_min = np.maximum(start_min, 0)
+        samples = np.maximum(end_min - first_min, 0)
+        sample_ends = np.cumsum(samples)
 
-            if has_valid_transits:
-                self.add_stat("Exoplanet Added", 1)
-                exoplanets.append({"exoplanet_details": exoplanet, "transits": transits, "alt_graph": alt_graph})
+        return np.column_stack([transit_table.planet, first_min, sample_ends - samples,
+                                sample_ends]).astype(np.int64).reshape(-1, 4)
 
-        exoplanets = self.sort_exoplanets(exoplanets, job["filters"]["order"])
+    def expand_transit_samples(self, transit_samples):
+        ranges = np.array(transit_samples, dtype=np.int64).reshape(-1, 4)
+        counts = ranges[:, 3] - ranges[:, 2]
 
-        print("Backend job done")
+        sample_star = np.repeat(ranges[:, 0], counts)
+        sample_minute = np.repeat(ranges[:, 1] - ranges[:, 2], counts) + np.arange(np.sum(counts))
 
-        return {"exoplanets": exoplanets, "sun_alt_graph": sun_alt_graph, "start_date": start_date_utc, "end_date": end_date_utc,
-                "observer_timezone": self.get_observer_timezone(job["observer"]), "observer": job["observer"]}
+        return sample_star, sample_minute
 
-    def sort_exoplanets(self, exoplanets, order):
-        cmp = None
+    def get_sort_key(self, exoplanet_details, order):
         if order == "Magnitude":
-            cmp = lambda item: item["exoplanet_details"]["mag"]
+            return exoplanet_details["mag"]
         elif order == "Transit depth":
-            cmp = lambda item: 1 - item["exoplanet_details"]["transit_dv"]
-        else:
+            return 1 - exoplanet_details["transit_dv"]
+
+        # Unordered results keep the order they were found in
+        return 0
+
+    def sort_exoplanets(self, exoplanets, order, key=lambda item: item["exoplanet_details"]):
+        if order not in ["Magnitude", "Transit depth"]:
             return exoplanets
 
-        exoplanets = sorted(exoplanets, key=cmp)
+        exoplanets = sorted(exoplanets, key=lambda item: self.get_sort_key(key(item), order))
         return exoplanets
 
-    def apply_exoplanet_filters(self, exoplanet_details, observer, filters):
-        # filter dec
-        dec = exoplanet_details["dec"][0]
+    def apply_exoplanet_filters(self, observer, filters):
+        # Ids of the stars that pass the declination and magnitude filters
         if "dec" in filters:
             min_dec, max_dec = filters["dec"]
         else:
@@ -240,72 +676,213 @@ class BackendThread(threading.Thread):
             else:
                 max_dec = 90 + lat
 
-        if dec < min_dec or dec > max_dec:
-            return False
+        return self.catalog_index.select(min_dec, max_dec, filters.get("mag"))
 
-        # filter mag
-        if "mag" in filters:
-            max_mag = filters["mag"]
-            if exoplanet_details["mag"] > max_mag:
-                return False
+    def select_candidates(self, job, sun_alt_graph, start_date_utc):
+        return [self.exoplanet_db[int(star_id)] for star_id in self.select_candidate_ids(job, sun_alt_graph,
+                                                                                         start_date_utc)]
 
-        return True
+    def select_candidate_ids(self, job, sun_alt_graph, start_date_utc):
+        star_ids = self.apply_exoplanet_filters(job["observer"], job["filters"])
+        self.add_stat("Exoplanets Reject by star", len(self.exoplanet_db) - len(star_ids))
 
-    def generate_altitude_graphs(self, exoplanets, job):
-        observer_location = EarthLocation(lat=job["observer"]["lat"],
-                                          lon=job["observer"]["lon"],
-                                          height=job["observer"]["height"] * units.m)
+        # Stars that stay below min_altitude while the sun is low enough, from the observer's latitude or because
+        # of their hour angle over the night, are rejected analytically before any transit lookup or transform
+        dark_starts, dark_ends = get_dark_intervals(sun_alt_graph["y"], job["filters"].get("sun_max_altitude", 90))
+        start_jd = datetime_to_jd(start_date_utc)
+        highest = max_altitudes(self.exoplanet_db.column("ra_deg")[star_ids],
+                                self.exoplanet_db.column("dec_deg")[star_ids],
+                                job["observer"]["lat"], job["observer"]["lon"],
+                                start_jd + dark_starts / 1440, start_jd + dark_ends / 1440)
+        reachable = highest >= job["filters"].get("min_altitude", 0) - PRESCREEN_MARGIN_DEG
+        self.add_stat("Exoplanets Reject by altitude prescreen", int(np.sum(~reachable)))
+
+        star_ids = star_ids[reachable]
+        self.add_stat("Exoplanets Analyzed", len(star_ids))
+
+        return star_ids
+
+    def get_observer_location(self, job):
+        from astropy.coordinates import EarthLocation
+        from astropy import units
 
-        ras = []
-        decs = []
-        cnt = 0
-        for exoplanet in exoplanets:
-            ra = exoplanet["ra"]
-            dec = exoplanet["dec"]
+        return EarthLocation(lat=job["observer"]["lat"],
+                             lon=job["observer"]["lon"],
+                             height=job["observer"]["height"] * units.m)
 
-            ras.append("%dh%dm%.2fs" % (ra[0], ra[1], ra[2]))
-            decs.append("%dd%dm%.2fs" % (dec[0], dec[1], dec[2]))
+    def get_star_coordinates(self, exoplanets):
+        # Coordinates of the whole catalog are built once and shared by every job and night
+        if self.catalog_coordinates is None:
+            from altaz import star_coordinates
+            self.catalog_coordinates = star_coordinates(self.exoplanet_db.column("ra_deg"),
+                                                        self.exoplanet_db.column("dec_deg"))
 
-        star_coordinates = SkyCoord(ra=ras,
-                                    dec=decs,
-                                    unit=(units.hourangle, units.deg), frame='icrs')
+        star_ids = np.array([exoplanet["id"] for exoplanet in exoplanets], dtype=np.int64)
+        return self.catalog_coordinates[star_ids]
 
+    def get_observation_times(self, job):
+        from astropy.time import Time
 
         start_date_utc = self.timezone_transform(job["start_date"], job["observer"])
         end_date_utc = self.timezone_transform(job["end_date"], job["observer"])
         observation_datetimes = np.arange(start_date_utc, end_date_utc, datetime.timedelta(minutes=1)).astype(
-            datetime.datetime).reshape(-1, 1)
+            datetime.datetime)
 
-        observation_times = Time(observation_datetimes, format='datetime')
+        return Time(observation_datetimes, format='datetime')
 
-        # Transform the equatorial coordinates to Altitude/Azimuth for the observer's location and time
-        altaz_coordinates = star_coordinates.transform_to(AltAz(obstime=observation_times, location=observer_location))
+    def load_altitude_grids(self, key, minutes):
+        altitude_grids = self.recent_altitude_grids.get(key)
+        if altitude_grids is None:
+            altitude_grids = self.altitude_cache.load(key, minutes)
 
-        graphs = []
-        for ex_id in range(0, len(exoplanets)):
-            x = np.arange(0, altaz_coordinates.shape[0])
-            y = altaz_coordinates[:,ex_id].alt.value
-            graphs.append({"x": x, "y": y})
+        return altitude_grids
 
-        return graphs
+    def sample_visible_catalog(self, job, altitude_grids, start_date_utc, end_date_utc, start_hjd, end_hjd):
+        with self.metrics.stage("filter", items=len(self.exoplanet_db)):
+            visible_ids = self.apply_exoplanet_filters(job["observer"], {})
 
-    def get_sun_alt_graph(self, job):
-        observer_location = EarthLocation(lat=job["observer"]["lat"],
-                                          lon=job["observer"]["lon"],
-                                          height=job["observer"]["height"] * units.m)
+        # A chunk of the visible stars at a time, the job can be cancelled in between
+        for chunk_start in range(0, len(visible_ids), VISIBLE_CATALOG_CHUNK_STARS):
+            chunk_ids = visible_ids[chunk_start:chunk_start + VISIBLE_CATALOG_CHUNK_STARS]
+            with self.metrics.stage("transit search", items=len(chunk_ids)):
+                visible = [self.exoplanet_db[int(star_id)] for star_id in chunk_ids]
+                visible_with_transits, visible_transits = self.find_transits(visible, start_hjd, end_hjd,
+                                                                             start_date_utc)
+                transit_samples = self.get_transit_sample_ranges(visible_with_transits, visible_transits,
+                                                                 start_date_utc, end_date_utc)
+                sample_star, sample_minute = self.expand_transit_samples(transit_samples)
+            self.get_cached_sample_altitudes(visible_with_transits, sample_star, sample_minute, job, altitude_grids)
+            self.check_cancelled()
 
-        start_date_utc = self.timezone_transform(job["start_date"], job["observer"])
-        end_date_utc = self.timezone_transform(job["end_date"], job["observer"])
+        altitude_grids.set_covers_visible_catalog()
 
-        sun_coord = get_sun(Time(start_date_utc, format='datetime'))
-        observation_datetimes = np.arange(start_date_utc, end_date_utc, datetime.timedelta(minutes=1)).astype(
-            datetime.datetime)
+    def get_altitude_cache_key(self, job, start_date_utc):
+        observer = job["observer"]
+        return (observer["lat"], observer["lon"], observer["height"], start_date_utc.isoformat(),
+                self.exoplanet_db.get_version(), job.get("altaz_engine", "astropy"), SUN_MODEL_VERSION)
 
-        sun_altaz = sun_coord.transform_to(AltAz(obstime=Time(observation_datetimes, format='datetime'),
-                                                 location=observer_location))
+    def get_night_minutes(self, start_date_utc, end_date_utc):
+        # Same length as the minute grid of get_observation_times
+        return int(np.ceil((end_date_utc - start_date_utc) / datetime.timedelta(minutes=1)))
 
-        x = np.arange(0, sun_altaz.shape[0])
-        y = sun_altaz.alt.value
+    def get_cached_sun_alt_graph(self, job, altitude_grids):
+        if altitude_grids.sun is not None:
+            return {"x": np.arange(0, len(altitude_grids.sun)), "y": altitude_grids.sun,
+                    "twilight": get_twilight_times(altitude_grids.sun)}
 
+        sun_alt_graph = self.get_sun_alt_graph(job)
+        altitude_grids.set_sun(sun_alt_graph["y"])
+
+        return sun_alt_graph
+
+    def get_cached_sample_altitudes(self, exoplanets, sample_star, sample_minute, job, altitude_grids):
+        star_ids = np.array([exoplanet["id"] for exoplanet in exoplanets], dtype=np.int64)[sample_star]
+        found, sample_altitudes = altitude_grids.get_samples(star_ids, sample_minute)
+
+        missing = np.flatnonzero(~found)
+        if len(missing) > 0:
+            # Only stars with missing samples are transformed, their star index is remapped to that subset. They
+            # are transformed a chunk at a time with a cancellation checkpoint in between, the samples of the
+            # chunks done before a cancellation are kept in the altitude grids.
+            missing_stars, missing_star_index = np.unique(sample_star[missing], return_inverse=True)
+            done_stars = 0
+            try:
+                while done_stars < len(missing_stars):
+                    chunk_stars = missing_stars[done_stars:done_stars + ALTITUDE_PASS_CHUNK_STARS]
+                    in_chunk = np.flatnonzero((missing_star_index >= done_stars) &
+                                              (missing_star_index < done_stars + len(chunk_stars)))
+                    sample_altitudes[missing[in_chunk]] = self.generate_sample_altitudes(
+                        [exoplanets[i] for i in chunk_stars], missing_star_index[in_chunk] - done_stars,
+                        sample_minute[missing[in_chunk]], job)
+                    done_stars += len(chunk_stars)
+                    self.check_cancelled()
+            finally:
+                done = missing[missing_star_index < done_stars]
+                altitude_grids.add_samples(star_ids[done], sample_minute[done], sample_altitudes[done])
+
+        self.add_stat("Altitude samples calculated", len(missing))
+        self.add_stat("Altitude samples from cache", len(sample_minute) - len(missing))
+
+        return sample_altitudes
+
+    def get_cached_altitude_rows(self, exoplanets, job, altitude_grids):
+        # float32 altitudes of every planet over the night, one row per planet
+        star_ids = np.array([exoplanet["id"] for exoplanet in exoplanets], dtype=np.int64)
+        found, cached_rows = altitude_grids.get_rows(star_ids)
+
+        rows = np.zeros((len(exoplanets), altitude_grids.minutes), dtype=np.float32)
+        rows[found] = cached_rows
+
+        missing = np.flatnonzero(~found)
+        done_rows = 0
+        try:
+            # Same chunks and checkpoints as get_cached_sample_altitudes
+            while done_rows < len(missing):
+                chunk = missing[done_rows:done_rows + ALTITUDE_PASS_CHUNK_STARS]
+                rows[chunk] = self.generate_altitude_graphs([exoplanets[i] for i in chunk], job)
+                done_rows += len(chunk)
+                self.check_cancelled()
+        finally:
+            altitude_grids.add_rows(star_ids[missing[:done_rows]], rows[missing[:done_rows]])
+
+        return rows
+
+    def uses_full_grid(self, job):
+        # An astropy transform costs mostly per time step and little per star, sparse samples followed by a
+        # second pass for the curves cost more than a single pass over every minute of the night
+        return job.get("altaz_engine", "astropy") != "fast"
+
+    def get_altaz_engine(self, engine_name):
+        from altaz import get_altaz_engine
+
+        if self.altaz_workers <= 1:
+            return get_altaz_engine(engine_name)
+
+        # Process pools are started on first use and kept for the lifetime of the backend
+        if engine_name not in self.parallel_altaz_engines:
+            self.parallel_altaz_engines[engine_name] = ParallelAltAzEngine(engine_name, self.altaz_workers,
+                                                                           self.altaz_chunk_size)
+
+        return self.parallel_altaz_engines[engine_name]
+
+    def generate_sample_altitudes(self, exoplanets, sample_star, sample_minute, job):
+        if len(sample_minute) == 0:
+            return np.zeros(0)
+
+        with self.metrics.stage("star altaz", items=len(sample_minute)):
+            observation_times = self.get_observation_times(job)
+            engine = self.get_altaz_engine(job.get("altaz_engine", "astropy"))
+
+            return engine.sample_altitudes(self.get_star_coordinates(exoplanets), sample_star, sample_minute,
+                                           observation_times, self.get_observer_location(job))
+
+    def generate_altitude_graphs(self, exoplanets, job):
+        # float32 altitude rows of the stars over the night, one row per star
+        if len(exoplanets) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        with self.metrics.stage("star altaz"):
+            observer_location = self.get_observer_location(job)
+            coordinates = self.get_star_coordinates(exoplanets)
+            observation_times = self.get_observation_times(job)
+
+            # Transform the equatorial coordinates to Altitude/Azimuth for the observer's location and time
+            engine_name = job.get("altaz_engine", "astropy")
+            altitudes = self.get_altaz_engine(engine_name).altitudes(coordinates, observation_times,
+                                                                     observer_location)
+            self.metrics.add_items("star altaz", altitudes.size)
+
+        if engine_name == "fast" and job.get("validate_altaz_engine", False):
+            from altaz import validate_fast_engine
+            report = validate_fast_engine(coordinates, observation_times, observer_location)
+            print("Fast alt/az engine validation on %d stars: max error %.2f arcsec, mean %.2f arcsec, %s" %
+                  (report["stars"], report["max_error_arcsec"], report["mean_error_arcsec"],
+                   "within bound" if report["within_bound"] else "OUT OF BOUND"))
+
+        return np.ascontiguousarray(altitudes.T, dtype=np.float32)
+
+    def get_sun_alt_graph(self, job):
+        # True sun position at hourly nodes, interpolated to the minute grid
+        y = sun_altitudes(self.get_observation_times(job), self.get_observer_location(job))
 
-        return {"x": x, "y": y}
+        return {"x": np.arange(0, len(y)), "y": y, "twilight": get_twilight_times(y)}
@@ -0,0 +1,235 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from backend import BackendThread
+from altitude_cache import AltitudeGridCache
+
+# Times the backend and plotting hot paths on the real catalog and on synthetic catalogs scaled from it.
+# Runs without Qt or a display, plots are drawn with Agg. Results are written as JSON to compare runs.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BENCHMARK_DATE = datetime.datetime(2025, 6, 21, 12, 0, tzinfo=datetime.timezone.utc)
+BENCHMARK_OBSERVER = {"lat": 44.4268, "lon": 26.1025, "height": 75}
+BENCHMARK_FILTERS = {"mag": 12.0, "min_altitude": 20.0, "sun_max_altitude": -5.0, "order": "Magnitude"}
+ALTITUDE_GRAPH_STARS = 200
+PLOT_COUNT = 20
+
+
+def write_scaled_catalog(source_path, target_path, scale, seed=0):
+    # The real catalog followed by scale - 1 copies of it, each star moved to a random position and each planet
+    # given a random transit phase, so the copies spread over the sky and over time like real entries
+    with open(source_path, "r") as f:
+        lines = f.readlines()
+
+    rng = np.random.default_rng(seed)
+    with open(target_path, "w") as f:
+        f.writelines(lines)
+        for copy in range(1, scale):
+            for i in range(0, len(lines) - 1, 3):
+                star, planet = [part.strip() for part in lines[i].split(',')[:2]]
+                fields = lines[i + 1].split(', ')
+                period = float(fields[5])
+
+                ra_hours = rng.uniform(0, 24)
+                dec_degrees = np.degrees(np.arcsin(rng.uniform(-1, 1)))
+                ra = "%d %d %f" % (ra_hours, ra_hours * 60 % 60, ra_hours * 3600 % 60)
+                dec = "%s%d %d %f" % ("-" if dec_degrees < 0 else "", abs(dec_degrees), abs(dec_degrees) * 60 % 60,
+                                      abs(dec_degrees) * 3600 % 60)
+                shift = rng.uniform(0, period) if period > 0 else 0
+
+                mid_transits = [float(value) + shift for value in lines[i + 2].split(',') if value.strip()] \
+                    if i + 2 < len(lines) else []
+
+                f.write("%s #%d,%s\n" % (star, copy, planet))
+                f.write(", ".join([ra, dec] + fields[2:6] + ["%f" % (float(fields[6]) + shift)]).rstrip("\n") + "\n")
+                f.write(",".join("%f" % value for value in mid_transits) + "\n")
+
+
+def measure(function, repeat):
+    durations = []
+    result = None
+    for _ in range(0, repeat):
+        start_time = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start_time)
+
+    return durations, result
+
+
+def get_benchmark_job(engine, nights=1):
+    return {
+        "start_date": BENCHMARK_DATE,
+        "end_date": BENCHMARK_DATE + datetime.timedelta(days=nights),
+        "observer": dict(BENCHMARK_OBSERVER),
+        "filters": dict(BENCHMARK_FILTERS),
+        "altaz_engine": engine,
+        "validate_altaz_engine": False
+    }
+
+
+def run_scale(catalog_path, scale, engine, repeat, work_dir, results):
+    def record(name, durations, **extra):
+        entry = {"name": name, "scale": scale, "engine": engine, "repeat": len(durations),
+                 "min": min(durations), "median": statistics.median(durations), "mean": statistics.mean(durations)}
+        entry.update(extra)
+        results.append(entry)
+        print("%-28s scale %4dx  min %8.3f s  median %8.3f s" % (name, scale, entry["min"], entry["median"]),
+              file=sys.stderr)
+
+    altitude_cache_dir = os.path.join(work_dir, "altitude_cache_%d" % scale)
+    backend = BackendThread(prefetch_nights=0, catalog_path=catalog_path,
+                            altitude_cache=AltitudeGridCache(altitude_cache_dir))
+
+    # The first read compiles the binary catalog, the following ones map it
+    binary_path = os.path.splitext(catalog_path)[0] + ".bin"
+    if os.path.exists(binary_path):
+        os.remove(binary_path)
+    durations, _ = measure(backend.read_database, 1)
+    record("read_database_compile", durations, planets=len(backend.exoplanet_db))
+    durations, _ = measure(backend.read_database, repeat)
+    record("read_database", durations, planets=len(backend.exoplanet_db))
+
+    job = get_benchmark_job(engine)
+
+    # Imports and first use costs are startup costs, they are kept out of the measurements
+    backend.warm_up()
+    backend.get_sun_alt_graph(job)
+
+    durations, _ = measure(lambda: backend.get_sun_alt_graph(job), repeat)
+    record("get_sun_alt_graph", durations)
+
+    # Cold runs start without any cached altitudes, warm runs reuse the ones retained by the previous run.
+    # Metrics restart with every run, the stage breakdown recorded is the one of the last run.
+    def cold_job():
+        backend.recent_altitude_grids.clear()
+        shutil.rmtree(altitude_cache_dir, ignore_errors=True)
+        return warm_job()
+
+    def warm_job():
+        backend.job_started(job, kind="benchmark")
+        return backend.execute_job_internal(job)
+
+    durations, night_result = measure(cold_job, repeat)
+    record("execute_job_internal_cold", durations, results=len(night_result["exoplanets"]),
+           stages=backend.metrics.to_dict()["stages"])
+    durations, night_result = measure(warm_job, repeat)
+    record("execute_job_internal_warm", durations, results=len(night_result["exoplanets"]),
+           stages=backend.metrics.to_dict()["stages"])
+
+    stars = [backend.exoplanet_db[star_id] for star_id in range(0, min(ALTITUDE_GRAPH_STARS, len(backend.exoplanet_db)))]
+    durations, _ = measure(lambda: backend.generate_altitude_graphs(stars, job), repeat)
+    record("generate_altitude_graphs", durations, stars=len(stars))
+
+    if len(night_result["exoplanets"]) > 0:
+        run_plot_benchmarks(night_result, repeat, record)
+
+
+def run_plot_benchmarks(night_result, repeat, record):
+    from widgets.transit_plot import TransitPlotImage, SkyBackground
+
+    observer_tz = night_result["observer_timezone"]
+    start_date = night_result["start_date"].replace(tzinfo=datetime.timezone.utc).astimezone(observer_tz)
+    end_date = night_result["end_date"].replace(tzinfo=datetime.timezone.utc).astimezone(observer_tz)
+    exoplanets = night_result["exoplanets"][:PLOT_COUNT]
+    sky_background = SkyBackground(night_result["sun_alt_graph"]["y"])
+
+    def create_plots(render):
+        for exoplanet in exoplanets:
+            plot = TransitPlotImage()
+            plot.create_plot(exoplanet, night_result["sun_alt_graph"], start_date, end_date, observer_tz,
+                             sky_background)
+            if render:
+                plot.render_rgba()
+
+    durations, _ = measure(lambda: create_plots(False), repeat)
+    record("create_plot", [duration / len(exoplanets) for duration in durations], plots=len(exoplanets))
+    durations, _ = measure(lambda: create_plots(True), repeat)
+    record("create_plot_and_render", [duration / len(exoplanets) for duration in durations], plots=len(exoplanets))
+
+
+def compare_results(baseline, results):
+    # Ratios of the baseline median to the current one, above 1 means the current run is faster
+    baseline_medians = {(entry["name"], entry["scale"], entry["engine"]): entry["median"]
+                        for entry in baseline["results"]}
+
+    for entry in results:
+        key = (entry["name"], entry["scale"], entry["engine"])
+        if key in baseline_medians and entry["median"] > 0:
+            print("%-28s scale %4dx  %8.3f s -> %8.3f s  x%.2f" % (entry["name"], entry["scale"], baseline_medians[key],
+                                                               entry["median"], baseline_medians[key] / entry["median"]),
+                  file=sys.stderr)
+
+
+def get_environment():
+    import astropy
+    import matplotlib
+
+    return {
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "astropy": astropy.__version__,
+        "matplotlib": matplotlib.__version__,
+        "cpu_count": os.cpu_count()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the backend and plotting hot paths.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100],
+                        help="Catalog sizes, as multiples of the real catalog")
+    parser.add_argument("--engine", choices=["astropy", "fast"], default="astropy", help="Alt/az engine")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement")
+    parser.add_argument("--catalog", default=os.path.join(APP_DIR, "transit_db.txt"), help="Real text catalog")
+    parser.add_argument("--work-dir", help="Directory for the synthetic catalogs and caches (default: temporary)")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+
+    work_dir = args.work_dir if args.work_dir else tempfile.mkdtemp(prefix="transit_benchmark_")
+    os.makedirs(work_dir, exist_ok=True)
+
+    results = []
+    try:
+        # The backend logs its progress on stdout, benchmark output goes to stderr and to the JSON file
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            for scale in args.scales:
+                catalog_path = os.path.join(work_dir, "transit_db_%dx.txt" % scale)
+                if not os.path.exists(catalog_path):
+                    write_scaled_catalog(args.catalog, catalog_path, scale)
+
+                run_scale(catalog_path, scale, args.engine, args.repeat, work_dir, results)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump({"environment": get_environment(), "results": results}, f, indent=2)
+        f.write("\n")
+
+    if baseline is not None:
+        compare_results(baseline, results)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
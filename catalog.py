@@ -0,0 +1,223 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+
+# Compiled catalog layout (little endian):
+#   header       magic, format version, record count, transit event count
+#   columns      one float64[count] block per entry of NUMERIC_COLUMNS, in order
+#   events       float64[event_count] precomputed mid-transit JDs of all planets, sorted,
+#                followed by int64[event_count] with the record id of each event
+#   name offsets int64[2 * count + 1], star name of record i is string 2 * i, planet name is 2 * i + 1
+#   name blob    utf-8 bytes of all names, concatenated
+CATALOG_MAGIC = b"ETCCAT\x00\x00"
+CATALOG_VERSION = 3
+HEADER_FORMAT = "<8sIII4x"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Largest difference between the spacing of consecutive precomputed events and the period, relative to the period,
+# for the events of a record to be used as its transits
+EVENT_SPACING_TOLERANCE = 0.01
+
+NUMERIC_COLUMNS = ["ra_h", "ra_m", "ra_s", "dec_d", "dec_m", "dec_s", "ra_deg", "dec_deg",
+                   "mag", "transit_dv", "duration", "period", "T0", "mid_transit_first", "mid_transit_last"]
+
+
+class CatalogFormatError(Exception):
+    pass
+
+
+def parse_text_catalog(text_path):
+    with open(text_path, "r") as f:
+        lines = f.readlines()
+
+    names = []
+    rows = []
+    event_jds = []
+    event_ids = []
+    inconsistent = []
+    for i in range(0, len(lines) - 1, 3):
+        star, planet = [part.strip() for part in lines[i].split(',')[:2]]
+        fields = lines[i + 1].split(', ')
+        ra = list(map(float, fields[0].split(' ')))
+        dec = list(map(float, fields[1].split(' ')))
+
+        # Third line holds the precomputed mid-transit times, it can be empty
+        mid_transits = []
+        if i + 2 < len(lines):
+            mid_transits = [float(value) for value in lines[i + 2].split(',') if value.strip()]
+
+        # Some records list their events twice or interleave another series. Duplicates are dropped, and a
+        # record whose events are not one period apart keeps none, its transits come from T0 / period.
+        mid_transits = np.unique(mid_transits)
+        period = float(fields[5])
+        if np.any(np.abs(np.diff(mid_transits) - period) > EVENT_SPACING_TOLERANCE * period):
+            inconsistent.append("%s %s" % (star, planet))
+            mid_transits = np.zeros(0)
+
+        names.append(star)
+        names.append(planet)
+        rows.append(ra + dec + [0, 0] + [float(value) for value in fields[2:7]] +
+                    [min(mid_transits, default=np.nan), max(mid_transits, default=np.nan)])
+        event_jds.extend(mid_transits)
+        event_ids.extend([len(rows) - 1] * len(mid_transits))
+
+    columns = np.array(rows, dtype=np.float64).reshape(-1, len(NUMERIC_COLUMNS)).T.copy()
+    ra_h, ra_m, ra_s, dec_d, dec_m, dec_s = columns[:6]
+    columns[NUMERIC_COLUMNS.index("ra_deg")] = (ra_h + ra_m / 60 + ra_s / 3600) * 15
+    # copysign keeps the sign of "-00 30 00" style declinations
+    columns[NUMERIC_COLUMNS.index("dec_deg")] = np.copysign(np.abs(dec_d) + dec_m / 60 + dec_s / 3600, dec_d)
+
+    if len(inconsistent) > 0:
+        print("Precomputed transits not one period apart, using T0 / period for: %s" % ", ".join(inconsistent))
+
+    event_jds = np.array(event_jds, dtype=np.float64)
+    event_ids = np.array(event_ids, dtype=np.int64)
+    event_order = np.argsort(event_jds, kind="stable")
+
+    return columns, names, event_jds[event_order], event_ids[event_order]
+
+
+def compile_catalog(text_path, binary_path):
+    columns, names, event_jds, event_ids = parse_text_catalog(text_path)
+    count = columns.shape[1]
+
+    encoded_names = [name.encode("utf-8") for name in names]
+    name_offsets = np.zeros(len(encoded_names) + 1, dtype=np.int64)
+    name_offsets[1:] = np.cumsum([len(name) for name in encoded_names])
+
+    # Write next to the target and rename, so a reader never maps a half written file
+    tmp_path = "%s.%d.tmp" % (binary_path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack(HEADER_FORMAT, CATALOG_MAGIC, CATALOG_VERSION, count, len(event_jds)))
+        f.write(columns.astype("<f8").tobytes())
+        f.write(event_jds.astype("<f8").tobytes())
+        f.write(event_ids.astype("<i8").tobytes())
+        f.write(name_offsets.astype("<i8").tobytes())
+        f.write(b"".join(encoded_names))
+    os.replace(tmp_path, binary_path)
+
+
+def default_binary_path(text_path):
+    return os.path.splitext(text_path)[0] + ".bin"
+
+
+class Catalog:
+    def __init__(self, binary_path):
+        self.path = binary_path
+        if os.path.getsize(binary_path) < HEADER_SIZE:
+            raise CatalogFormatError("%s is too small to be a compiled catalog" % binary_path)
+
+        self.data = np.memmap(binary_path, dtype=np.uint8, mode="r")
+
+        magic, version, count, event_count = struct.unpack(HEADER_FORMAT, self.data[:HEADER_SIZE].tobytes())
+        if magic != CATALOG_MAGIC or version != CATALOG_VERSION:
+            raise CatalogFormatError("%s is not a compiled catalog of version %d" % (binary_path, CATALOG_VERSION))
+
+        self.count = count
+        self.columns = {}
+        offset = HEADER_SIZE
+        for name in NUMERIC_COLUMNS:
+            self.columns[name] = np.ndarray((count,), dtype="<f8", buffer=self.data, offset=offset)
+            offset += 8 * count
+
+        self.event_count = event_count
+        self.event_jds = np.ndarray((event_count,), dtype="<f8", buffer=self.data, offset=offset)
+        offset += 8 * event_count
+        self.event_ids = np.ndarray((event_count,), dtype="<i8", buffer=self.data, offset=offset)
+        offset += 8 * event_count
+
+        self.name_offsets = np.ndarray((2 * count + 1,), dtype="<i8", buffer=self.data, offset=offset)
+        offset += 8 * (2 * count + 1)
+        self.name_blob_offset = offset
+
+        if len(self.data) != offset + int(self.name_offsets[-1]):
+            raise CatalogFormatError("%s is truncated" % binary_path)
+
+        self.version = None
+
+    @staticmethod
+    def open(text_path, binary_path=None):
+        # Compiles the text catalog when the binary one is missing, stale or unreadable
+        if binary_path is None:
+            binary_path = default_binary_path(text_path)
+
+        if not os.path.exists(binary_path) or os.path.getmtime(text_path) > os.path.getmtime(binary_path):
+            compile_catalog(text_path, binary_path)
+
+        try:
+            return Catalog(binary_path)
+        except CatalogFormatError:
+            compile_catalog(text_path, binary_path)
+            return Catalog(binary_path)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(0, self.count):
+            yield self[i]
+
+    def __getitem__(self, i):
+        return {
+            "id": i,
+            "star": self.get_name(2 * i),
+            "planet": self.get_name(2 * i + 1),
+            "ra": [float(self.columns["ra_h"][i]), float(self.columns["ra_m"][i]), float(self.columns["ra_s"][i])],
+            "dec": [float(self.columns["dec_d"][i]), float(self.columns["dec_m"][i]), float(self.columns["dec_s"][i])],
+            "mag": float(self.columns["mag"][i]),
+            "transit_dv": float(self.columns["transit_dv"][i]),
+            "duration": float(self.columns["duration"][i]),
+            "period": float(self.columns["period"][i]),
+            "T0": float(self.columns["T0"][i])
+        }
+
+    def get_version(self):
+        # Content checksum, identifies the catalog in caches that outlive the process
+        if self.version is None:
+            self.version = "%08x" % zlib.crc32(self.data)
+
+        return self.version
+
+    def column(self, name):
+        return self.columns[name]
+
+    def get_name(self, name_id):
+        start = self.name_blob_offset + int(self.name_offsets[name_id])
+        end = self.name_blob_offset + int(self.name_offsets[name_id + 1])
+        return self.data[start:end].tobytes().decode("utf-8")
+
+
+class CatalogIndex:
+    # Declination and magnitude columns sorted once per catalog, so the range filters of a job are binary
+    # searches. Rows with a missing value pass the filter, the same as the comparisons of a linear scan.
+    def __init__(self, catalog):
+        self.count = len(catalog)
+        # Declination filters apply to the whole degrees of the declination
+        self.dec_order, self.sorted_dec, self.unknown_dec = self.sort_column(catalog.column("dec_d"))
+        self.mag_order, self.sorted_mag, self.unknown_mag = self.sort_column(catalog.column("mag"))
+
+    def sort_column(self, values):
+        known = np.flatnonzero(~np.isnan(values))
+        order = known[np.argsort(values[known], kind="stable")]
+
+        return order, values[order], np.flatnonzero(np.isnan(values))
+
+    def range_mask(self, order, sorted_values, unknown, low, high):
+        start = np.searchsorted(sorted_values, low, side="left")
+        end = np.searchsorted(sorted_values, high, side="right")
+
+        mask = np.zeros(self.count, dtype=bool)
+        mask[order[start:end]] = True
+        mask[unknown] = True
+
+        return mask
+
+    def select(self, min_dec, max_dec, max_mag=None):
+        # Ids, in catalog order, of the rows with min_dec <= dec <= max_dec and mag <= max_mag
+        mask = self.range_mask(self.dec_order, self.sorted_dec, self.unknown_dec, min_dec, max_dec)
+        if max_mag is not None:
+            mask &= self.range_mask(self.mag_order, self.sorted_mag, self.unknown_mag, -np.inf, max_mag)
+
+        return np.flatnonzero(mask)
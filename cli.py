@@ -0,0 +1,268 @@
+import argparse
+import contextlib
+import csv
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+
+from backend import BackendThread
+from parallel_altaz import DEFAULT_ALTAZ_CHUNK_SIZE
+from altitude_cache import AltitudeGridCache
+
+# Runs transit searches without the GUI, e.g. from cron. Only the backend pipeline is imported here,
+# never PyQt6, matplotlib or qdarktheme.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ORDER_OPTIONS = ["Magnitude", "Transit depth", "None"]
+
+CSV_COLUMNS = ["job", "star", "planet", "ra_h", "ra_m", "ra_s", "dec_d", "dec_m", "dec_s", "mag", "transit_dv",
+               "duration", "period", "start_utc", "end_utc", "valid", "observable_fraction", "sites"]
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description="Searches observable exoplanet transits without the GUI.")
+    parser.add_argument("--date", help="First night, as YYYY-MM-DD (default: today)")
+    parser.add_argument("--nights", type=int, default=1, help="Number of nights to search")
+    parser.add_argument("--lat", type=float, help="Observer latitude (deg)")
+    parser.add_argument("--lon", type=float, help="Observer longitude (deg)")
+    parser.add_argument("--height", type=float, default=75, help="Observer elevation (m)")
+    parser.add_argument("--site", action="append", default=[], metavar="LAT,LON[,HEIGHT[,NAME]]",
+                        help="Observer of a multi-site search, repeat for every site (replaces --lat/--lon), "
+                             "e.g. --site=-30.17,-70.81,2200,Tololo")
+    parser.add_argument("--max-mag", type=float, help="Max star magnitude")
+    parser.add_argument("--min-dec", type=float, help="Min declination (deg)")
+    parser.add_argument("--max-dec", type=float, help="Max declination (deg)")
+    parser.add_argument("--min-altitude", type=float, help="Min star altitude during the transit (deg)")
+    parser.add_argument("--max-sun-altitude", type=float, help="Max sun altitude during the transit (deg)")
+    parser.add_argument("--order", choices=ORDER_OPTIONS, default="Magnitude", help="Ordering of the results")
+    parser.add_argument("--engine", choices=["astropy", "fast"], default="astropy", help="Alt/az engine")
+    parser.add_argument("--validate-engine", action="store_true",
+                        help="Compare the fast engine against astropy on a sample of stars")
+    parser.add_argument("--altaz-workers", type=int, default=1, help="Processes used for the alt/az computation")
+    parser.add_argument("--altaz-chunk-size", type=int, default=DEFAULT_ALTAZ_CHUNK_SIZE,
+                        help="Stars per task of the alt/az worker processes")
+    parser.add_argument("--batch", help="JSON file with a list of jobs; each one overrides the options above")
+    parser.add_argument("--format", choices=["json", "csv"], default="json", help="Output format")
+    parser.add_argument("--output", help="Output file (default: stdout)")
+    parser.add_argument("--catalog", default=os.path.join(APP_DIR, "transit_db.txt"), help="Text catalog path")
+    parser.add_argument("--altitude-cache", default=os.path.join(APP_DIR, "altitude_cache"),
+                        help="Directory of the altitude cache")
+    parser.add_argument("--metrics", help="JSON file for the stage timings and counters of every job")
+    parser.add_argument("--metrics-log", help="Rolling log the stage timings of every job are appended to")
+
+    return parser.parse_args(attach_site_values(sys.argv[1:] if argv is None else argv))
+
+def attach_site_values(argv):
+    # argparse takes a value starting with "-" for an option unless it is a single number, so a site with a
+    # negative latitude given as "--site -30.2,-70.7" is passed to it as "--site=-30.2,-70.7"
+    attached = []
+    for arg in argv:
+        if len(attached) > 0 and attached[-1] == "--site" and arg.startswith("-") and "," in arg:
+            attached[-1] = "--site=" + arg
+        else:
+            attached.append(arg)
+
+    return attached
+
+def get_base_spec(args):
+    # Job description in the batch file format, built from the command line options
+    filters = {"order": args.order}
+    if args.max_mag is not None:
+        filters["mag"] = args.max_mag
+    if args.min_dec is not None or args.max_dec is not None:
+        filters["dec"] = (args.min_dec if args.min_dec is not None else -90,
+                          args.max_dec if args.max_dec is not None else 90)
+    if args.min_altitude is not None:
+        filters["min_altitude"] = args.min_altitude
+    if args.max_sun_altitude is not None:
+        filters["sun_max_altitude"] = args.max_sun_altitude
+
+    observer = {"height": args.height}
+    if args.lat is not None:
+        observer["lat"] = args.lat
+    if args.lon is not None:
+        observer["lon"] = args.lon
+
+    spec = {
+        "date": args.date if args.date is not None else datetime.date.today().isoformat(),
+        "nights": args.nights,
+        "observer": observer,
+        "filters": filters,
+        "altaz_engine": args.engine,
+        "validate_altaz_engine": args.validate_engine
+    }
+    if len(args.site) > 0:
+        spec["observers"] = [parse_site(site, args.height) for site in args.site]
+
+    return spec
+
+def parse_site(text, default_height):
+    parts = [part.strip() for part in text.split(",")]
+    if len(parts) < 2:
+        raise SystemExit("Invalid site %r, expected LAT,LON[,HEIGHT[,NAME]]" % text)
+
+    site = {"lat": float(parts[0]), "lon": float(parts[1]),
+            "height": float(parts[2]) if len(parts) > 2 and parts[2] else default_height}
+    if len(parts) > 3:
+        site["name"] = parts[3]
+
+    return site
+
+def merge_spec(base_spec, spec):
+    merged = dict(base_spec)
+    merged.update(spec)
+    merged["observer"] = dict(base_spec["observer"], **spec.get("observer", {}))
+    merged["filters"] = dict(base_spec["filters"], **spec.get("filters", {}))
+
+    return merged
+
+def build_job(spec):
+    observers = spec.get("observers", [])
+    for observer in [spec["observer"]] if len(observers) == 0 else observers:
+        if "lat" not in observer or "lon" not in observer:
+            raise ValueError("Observer latitude and longitude are required")
+
+    # A plain date, the backend starts the night at noon of that date in the timezone of each observer
+    start_date = datetime.datetime.strptime(spec["date"], "%Y-%m-%d").date()
+    filters = dict(spec["filters"])
+    if "dec" in filters:
+        filters["dec"] = tuple(filters["dec"])
+
+    job = {
+        "start_date": start_date,
+        "end_date": start_date + datetime.timedelta(days=int(spec["nights"])),
+        "observer": dict(spec["observer"]),
+        "filters": filters,
+        "altaz_engine": spec["altaz_engine"],
+        "validate_altaz_engine": spec["validate_altaz_engine"]
+    }
+    if len(observers) > 0:
+        job["observers"] = [dict({"height": spec["observer"].get("height", 0), "name": "site %d" % (site + 1)},
+                                 **observers[site]) for site in range(0, len(observers))]
+
+    return job
+
+def read_batch(path, base_spec):
+    with open(path, "r") as f:
+        specs = json.load(f)
+
+    if isinstance(specs, dict):
+        specs = [specs]
+
+    return [merge_spec(base_spec, spec) for spec in specs]
+
+def get_transit_row(details, transit_dates, valid, observable_fraction):
+    return {
+        "star": details["star"],
+        "planet": details["planet"],
+        "ra": list(details["ra"]),
+        "dec": list(details["dec"]),
+        "mag": details["mag"],
+        "transit_dv": details["transit_dv"],
+        "duration": details["duration"],
+        "period": details["period"],
+        "start_utc": transit_dates[0].isoformat(),
+        "end_utc": transit_dates[1].isoformat(),
+        "valid": bool(valid),
+        "observable_fraction": float(observable_fraction)
+    }
+
+def run_job(backend, job):
+    # Same pipeline as the GUI, results are collected instead of being sent to the frontend
+    transits = []
+
+    def on_results(result):
+        for exoplanet in result["exoplanets"]:
+            transit_dates = exoplanet.transit_datetimes()
+            for transit_id in range(0, len(transit_dates)):
+                transits.append(get_transit_row(exoplanet.details, transit_dates[transit_id],
+                                                exoplanet.valid[transit_id],
+                                                exoplanet.observable_fraction[transit_id]))
+
+    def on_multi_site_results(result):
+        # A transit is valid when any site can observe it, its fraction is the best one among the sites
+        names = [observer["name"] for observer in result["observers"]]
+        for exoplanet in result["exoplanets"]:
+            transit_dates = exoplanet.transit_datetimes()
+            for transit_id in range(0, len(transit_dates)):
+                site_valid = exoplanet.site_valid[transit_id]
+                site_fractions = exoplanet.site_observable_fraction[transit_id]
+
+                transit = get_transit_row(exoplanet.details, transit_dates[transit_id], site_valid.any(),
+                                          site_fractions.max())
+                transit["sites"] = [names[site] for site in range(0, len(names)) if site_valid[site]]
+                transit["site_fractions"] = {names[site]: float(site_fractions[site])
+                                             for site in range(0, len(names))}
+                transits.append(transit)
+
+    if "observers" in job:
+        backend.execute_multi_site_job(job, on_multi_site_results)
+    else:
+        backend.execute_job(job, on_results)
+
+    return transits
+
+def write_json(output, results):
+    json.dump([{"job": spec, "transits": transits} for spec, transits in results], output, indent=2)
+    output.write("\n")
+
+def write_csv(output, results):
+    writer = csv.writer(output)
+    writer.writerow(CSV_COLUMNS)
+    for job_index in range(0, len(results)):
+        for transit in results[job_index][1]:
+            writer.writerow([job_index, transit["star"], transit["planet"]] + transit["ra"] + transit["dec"] +
+                            [transit["mag"], transit["transit_dv"], transit["duration"], transit["period"],
+                             transit["start_utc"], transit["end_utc"], transit["valid"], transit["observable_fraction"],
+                             ";".join(transit.get("sites", []))])
+
+def main(argv=None):
+    args = parse_arguments(argv)
+
+    base_spec = get_base_spec(args)
+    specs = read_batch(args.batch, base_spec) if args.batch else [base_spec]
+    try:
+        jobs = [build_job(spec) for spec in specs]
+    except (ValueError, KeyError) as e:
+        print("Invalid job: %s" % e, file=sys.stderr)
+        return 2
+
+    backend = BackendThread(prefetch_nights=0, altaz_workers=args.altaz_workers,
+                            altaz_chunk_size=args.altaz_chunk_size, catalog_path=args.catalog,
+                            altitude_cache=AltitudeGridCache(args.altitude_cache),
+                            metrics_log=args.metrics_log)
+
+    results = []
+    job_metrics = []
+    # The backend logs its progress and stats on stdout, which is kept for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        backend.read_database()
+        try:
+            for job_index in range(0, len(jobs)):
+                print("Running job %d of %d: %s" % (job_index + 1, len(jobs), specs[job_index]))
+                results.append((specs[job_index], run_job(backend, jobs[job_index])))
+                job_metrics.append(dict(backend.metrics.to_dict(), job=specs[job_index]))
+        finally:
+            for engine in backend.parallel_altaz_engines.values():
+                engine.shutdown()
+
+    write = write_json if args.format == "json" else write_csv
+    if args.output:
+        with open(args.output, "w", newline="") as output:
+            write(output, results)
+    else:
+        write(sys.stdout, results)
+
+    if args.metrics:
+        with open(args.metrics, "w") as f:
+            json.dump(job_metrics, f, indent=2)
+            f.write("\n")
+
+    return 0
+
+if __name__ == "__main__":
+    # Needed by the alt/az worker processes in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+    sys.exit(main())
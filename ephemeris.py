@@ -0,0 +1,105 @@
+import datetime
+
+import numpy as np
+
+J2000_JD = 2451545.0
+J2000_DATETIME = datetime.datetime(2000, 1, 1, 12, 0, 0)
+
+
+def datetime_to_jd(date):
+    return J2000_JD + (date - J2000_DATETIME).total_seconds() / 86400
+
+
+def jd_to_datetimes(jds):
+    # Microsecond arithmetic on datetime64 instead of one astropy Time per value
+    offsets = np.round((np.asarray(jds, dtype=np.float64) - J2000_JD) * 86400e6).astype("timedelta64[us]")
+    return (np.datetime64(J2000_DATETIME, "us") + offsets).astype(datetime.datetime)
+
+
+def jd_to_minute_offsets(jds, start_date):
+    # Whole minutes from start_date, truncated towards zero, the same as int() of the timedelta in minutes
+    # between jd_to_datetimes(jds) and start_date
+    offsets = np.round((np.asarray(jds, dtype=np.float64) - J2000_JD) * 86400e6).astype(np.int64)
+    start_offset = (start_date - J2000_DATETIME) // datetime.timedelta(microseconds=1)
+
+    return np.trunc((offsets - start_offset) / 1e6 / 60).astype(np.int64)
+
+
+def find_transit_windows(t0, period, duration, start_jd, end_jd):
+    # All transits of all planets overlapping [start_jd, end_jd), in a single vectorized pass.
+    # t0 and period are in days, duration in minutes, like the catalog columns.
+    # Returns flat (planet_index, transit_start, transit_end) arrays, grouped by planet index.
+    t0 = np.asarray(t0, dtype=np.float64)
+    period = np.asarray(period, dtype=np.float64)
+    half_duration = np.asarray(duration, dtype=np.float64) / 1440 / 2
+
+    # Epoch k transits from t0 + k * period - half_duration to t0 + k * period + half_duration
+    first_epoch = np.floor((start_jd - t0 - half_duration) / period) + 1
+    last_epoch = np.ceil((end_jd - t0 + half_duration) / period) - 1
+    counts = np.maximum(last_epoch - first_epoch + 1, 0).astype(np.int64)
+
+    planet_index = np.repeat(np.arange(len(t0)), counts)
+    group_starts = np.cumsum(counts) - counts
+    epochs = first_epoch[planet_index] + (np.arange(len(planet_index)) - group_starts[planet_index])
+
+    mid_transit = t0[planet_index] + epochs * period[planet_index]
+    return planet_index, mid_transit - half_duration[planet_index], mid_transit + half_duration[planet_index]
+
+
+class TransitEventIndex:
+    # Sorted mid-transit events of the whole catalog. A window query is two binary searches over
+    # the merged event array. Planets whose precomputed events do not cover the whole window are
+    # computed from T0 / period instead and reported as fallbacks.
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.event_jds = catalog.event_jds
+        self.event_ids = catalog.event_ids
+        self.max_half_duration = float(np.max(catalog.column("duration"), initial=0)) / 1440 / 2
+
+    def query(self, candidate_ids, start_jd, end_jd):
+        # Same result layout as find_transit_windows, where planet_index points into candidate_ids.
+        # The fourth value holds the positions in candidate_ids that needed the T0 / period fallback.
+        candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+        period = self.catalog.column("period")[candidate_ids]
+        half_duration = self.catalog.column("duration")[candidate_ids] / 1440 / 2
+        first = self.catalog.column("mid_transit_first")[candidate_ids]
+        last = self.catalog.column("mid_transit_last")[candidate_ids]
+
+        # Compiled events are one period apart (see parse_text_catalog), so every mid-transit in [first, last]
+        # is listed and the events cover the window when the neighbouring unlisted transits cannot overlap it.
+        # NaN bounds (no events, or events dropped by the compiler) are never covered.
+        covered = (first - period <= start_jd - half_duration) & (end_jd + half_duration <= last + period)
+        fallback_index = np.flatnonzero(~covered)
+
+        candidate_position = np.full(len(self.catalog), -1, dtype=np.int64)
+        candidate_position[candidate_ids[covered]] = np.flatnonzero(covered)
+
+        lo = np.searchsorted(self.event_jds, start_jd - self.max_half_duration, side="left")
+        hi = np.searchsorted(self.event_jds, end_jd + self.max_half_duration, side="right")
+        mid_transit = self.event_jds[lo:hi]
+        planet_index = candidate_position[self.event_ids[lo:hi]]
+
+        keep = planet_index >= 0
+        mid_transit = mid_transit[keep]
+        planet_index = planet_index[keep]
+        event_half_duration = half_duration[planet_index]
+
+        overlaps = (mid_transit - event_half_duration < end_jd) & (mid_transit + event_half_duration > start_jd)
+        planet_index = planet_index[overlaps]
+        starts = mid_transit[overlaps] - event_half_duration[overlaps]
+        ends = mid_transit[overlaps] + event_half_duration[overlaps]
+
+        if len(fallback_index) > 0:
+            fallback_planets, fallback_starts, fallback_ends = find_transit_windows(
+                self.catalog.column("T0")[candidate_ids[fallback_index]],
+                period[fallback_index],
+                self.catalog.column("duration")[candidate_ids[fallback_index]],
+                start_jd, end_jd)
+
+            planet_index = np.concatenate([planet_index, fallback_index[fallback_planets]])
+            starts = np.concatenate([starts, fallback_starts])
+            ends = np.concatenate([ends, fallback_ends])
+
+        # Group by planet, keeping each planet's transits in time order
+        order = np.lexsort((starts, planet_index))
+        return planet_index[order], starts[order], ends[order], fallback_index
@@ -7,8 +7,12 @@ from PyQt6.QtGui import QFont
 
 import qdarktheme
 
+from utils import mark_startup_phase
 from widgets.main_widget import MainWidget
 
+def warm_up_plots():
+    import widgets.transit_plot
+
 class MainWindow(QMainWindow):
 
     def __init__(self, frontend_thread, *args, **kwargs):
@@ -42,15 +46,20 @@ class MainWindow(QMainWindow):
 
         self.show()
 
+    def shutdown(self):
+        self.main_widget.transit_selector_widget.transit_list_widget.shutdown()
+
     def refresh_transits(self, result):
         # self.main_widget.refresh_transits(result)
         self.main_widget.new_data.emit(result)
 
 class FrontendThread(threading.Thread):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, plot_workers=0, **kwargs):
         super(FrontendThread, self).__init__(*args, **kwargs)
 
         self.backend_thread = None
+        # More than zero workers rasterize the transit plots in a process pool instead of the GUI thread
+        self.plot_workers = plot_workers
 
     def set_backend_thread(self, backend_thread):
         self.backend_thread = backend_thread
@@ -60,8 +69,17 @@ class FrontendThread(threading.Thread):
         qdarktheme.setup_theme()
 
         self.main_window = MainWindow(self)
+        QtCore.QTimer.singleShot(0, self.on_window_shown)
         app.exec()
 
+        self.main_window.shutdown()
+
+    def on_window_shown(self):
+        mark_startup_phase("Window shown")
+
+        # Matplotlib is only needed to draw the first results, it is loaded while the backend computes them
+        threading.Thread(target=warm_up_plots, daemon=True).start()
+
     def on_backend_job_done(self, result):
         self.main_window.refresh_transits(result)
 
@@ -1,13 +1,38 @@
+import argparse
+import multiprocessing
 import threading
 import time
 import sys
 
+from utils import mark_startup_phase
 from frontend import FrontendThread
 from backend import BackendThread
+from parallel_altaz import DEFAULT_ALTAZ_CHUNK_SIZE
+
+# Rolling log of the stage timings of the last jobs
+METRICS_LOG_PATH = "job_metrics.log"
+
+def parse_arguments(argv):
+    # Options the GUI does not know about are left to Qt
+    parser = argparse.ArgumentParser(description="Checks when exoplanet transits can be observed.")
+    parser.add_argument("--plot-workers", type=int, default=0,
+                        help="Processes rendering the transit plots (default: 0, drawn on the GUI thread)")
+    parser.add_argument("--altaz-workers", type=int, default=1,
+                        help="Processes used for the alt/az computation (default: 1, on the backend thread)")
+    parser.add_argument("--altaz-chunk-size", type=int, default=DEFAULT_ALTAZ_CHUNK_SIZE,
+                        help="Stars per task of the alt/az worker processes")
+
+    return parser.parse_known_args(argv)[0]
 
 if __name__ == "__main__":
-    frontend_thread = FrontendThread()
-    backend_thread = BackendThread()
+    # Needed by the alt/az worker processes in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+    mark_startup_phase("Modules imported")
+    args = parse_arguments(sys.argv[1:])
+
+    frontend_thread = FrontendThread(plot_workers=args.plot_workers)
+    backend_thread = BackendThread(altaz_workers=args.altaz_workers, altaz_chunk_size=args.altaz_chunk_size,
+                                   metrics_log=METRICS_LOG_PATH)
 
     frontend_thread.set_backend_thread(backend_thread)
     backend_thread.set_frontend_thread(frontend_thread)
@@ -6,11 +6,12 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    # Imported inside functions to keep them off the startup path
+    hiddenimports=['altaz', 'widgets.transit_plot', 'timezonefinder', 'matplotlib.backends.backend_agg'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=['tkinter'],
     noarchive=False,
 )
 pyz = PYZ(a.pure)
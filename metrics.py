@@ -0,0 +1,112 @@
+import contextlib
+import datetime
+import json
+import os
+import time
+
+# Jobs kept in a rolling metrics log, the oldest ones are dropped first
+DEFAULT_METRICS_LOG_ENTRIES = 200
+
+
+class JobMetrics:
+    # Wall time, calls and items per pipeline stage of a job, with the job counters. Stages can nest, the time of
+    # a stage excludes the stages running inside it, so the stage times of a job add up to its duration.
+    def __init__(self, job_id=None, kind="job"):
+        self.job_id = job_id
+        self.kind = kind
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self.start_time = time.perf_counter()
+        self.duration = None
+        self.cancelled = False
+        self.stages = {}
+        self.counters = {}
+        # Running stages, innermost last, with the time they were last entered or resumed
+        self.running = []
+
+    def get_stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = {"seconds": 0.0, "calls": 0, "items": 0}
+
+        return self.stages[name]
+
+    def begin(self, name, items=0):
+        now = time.perf_counter()
+        if len(self.running) > 0:
+            self.get_stage(self.running[-1][0])["seconds"] += now - self.running[-1][1]
+
+        stage = self.get_stage(name)
+        stage["calls"] += 1
+        stage["items"] += items
+        self.running.append([name, now])
+
+    def end(self):
+        now = time.perf_counter()
+        name, resumed = self.running.pop()
+        self.get_stage(name)["seconds"] += now - resumed
+
+        if len(self.running) > 0:
+            self.running[-1][1] = now
+
+    @contextlib.contextmanager
+    def stage(self, name, items=0):
+        self.begin(name, items)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def add_items(self, name, items):
+        self.get_stage(name)["items"] += items
+
+    def add_count(self, key, value):
+        if key not in self.counters:
+            self.counters[key] = 0
+
+        self.counters[key] += value
+
+    def finish(self, cancelled=False):
+        while len(self.running) > 0:
+            self.end()
+
+        self.duration = time.perf_counter() - self.start_time
+        self.cancelled = cancelled
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "started": self.started.isoformat(),
+            "duration": self.duration,
+            "cancelled": self.cancelled,
+            "stages": {name: dict(stage) for name, stage in self.stages.items()},
+            "counters": dict(self.counters)
+        }
+
+    def format_report(self):
+        lines = ["Job took: %.2f seconds%s" % (self.duration or 0, " (cancelled)" if self.cancelled else ""),
+                 "Stages:"]
+        for name, stage in self.stages.items():
+            lines.append("%s: %.3f s, %d calls, %d items" % (name, stage["seconds"], stage["calls"], stage["items"]))
+
+        lines.append("Stats:")
+        for key in self.counters:
+            lines.append("%s: %d" % (key, self.counters[key]))
+
+        return "\n".join(lines)
+
+    def append_to_log(self, path, max_entries=DEFAULT_METRICS_LOG_ENTRIES):
+        # One JSON object per line, the file is rewritten with the last max_entries jobs when it grows past them
+        entries = []
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                entries = [line for line in f if line.strip()]
+
+        entries.append(json.dumps(self.to_dict()) + "\n")
+        if len(entries) > max_entries:
+            tmp_path = "%s.%d.tmp" % (path, os.getpid())
+            with open(tmp_path, "w") as f:
+                f.writelines(entries[-max_entries:])
+            os.replace(tmp_path, path)
+        else:
+            with open(path, "a") as f:
+                f.write(entries[-1])
@@ -0,0 +1,113 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils import spawn_process_pool
+
+# Astropy is imported where it is used, so importing this module stays cheap at startup
+
+DEFAULT_ALTAZ_CHUNK_SIZE = 128
+
+
+def compute_chunk(shm_name, shape, target, ra_deg, dec_deg, jd1, jd2, location, engine_name, samples):
+    # Runs in a worker process. Inputs are small arrays, the altitudes are written straight into the shared
+    # output buffer: the column slice target of a (times, stars) grid, or the positions target of a sample array.
+    from astropy.coordinates import EarthLocation
+    from astropy.time import Time
+    from astropy import units
+    from altaz import get_altaz_engine, star_coordinates
+
+    coordinates = star_coordinates(ra_deg, dec_deg)
+    observation_times = Time(jd1, jd2, format='jd', scale='utc')
+    observer_location = EarthLocation(lat=location[0] * units.deg, lon=location[1] * units.deg,
+                                      height=location[2] * units.m)
+    engine = get_altaz_engine(engine_name)
+
+    if samples is None:
+        altitudes = engine.altitudes(coordinates, observation_times, observer_location)
+    else:
+        star_index, sample_minute = samples
+        altitudes = engine.sample_altitudes(coordinates, star_index, sample_minute, observation_times,
+                                            observer_location)
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        output = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        output[target] = altitudes
+    finally:
+        shm.close()
+
+
+class ParallelAltAzEngine:
+    # Same interface as the engines of altaz.py. Stars are split in chunks of chunk_size that are computed by
+    # a process pool; results come back through shared memory instead of pickled arrays.
+    def __init__(self, engine_name, workers, chunk_size=DEFAULT_ALTAZ_CHUNK_SIZE):
+        self.engine_name = engine_name
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = spawn_process_pool(self.workers)
+
+        return self.executor
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def altitudes(self, coordinates, observation_times, observer_location):
+        from altaz import get_altaz_engine
+
+        if len(coordinates) <= self.chunk_size:
+            return get_altaz_engine(self.engine_name).altitudes(coordinates, observation_times, observer_location)
+
+        shape = (len(observation_times), len(coordinates))
+        tasks = []
+        for start in range(0, len(coordinates), self.chunk_size):
+            end = min(start + self.chunk_size, len(coordinates))
+            tasks.append((np.s_[:, start:end], np.arange(start, end), None))
+
+        return self.run_tasks(shape, tasks, coordinates, observation_times, observer_location)
+
+    def sample_altitudes(self, coordinates, star_index, sample_minute, observation_times, observer_location):
+        from altaz import get_altaz_engine
+
+        if len(coordinates) <= self.chunk_size:
+            return get_altaz_engine(self.engine_name).sample_altitudes(coordinates, star_index, sample_minute,
+                                                                        observation_times, observer_location)
+
+        tasks = []
+        for start in range(0, len(coordinates), self.chunk_size):
+            in_chunk = np.flatnonzero((star_index >= start) & (star_index < start + self.chunk_size))
+            if len(in_chunk) > 0:
+                stars = np.arange(start, min(start + self.chunk_size, len(coordinates)))
+                tasks.append((in_chunk, stars, (star_index[in_chunk] - start, sample_minute[in_chunk])))
+
+        return self.run_tasks((len(sample_minute),), tasks, coordinates, observation_times, observer_location)
+
+    def run_tasks(self, shape, tasks, coordinates, observation_times, observer_location):
+        from astropy import units
+
+        ra_deg = coordinates.ra.deg
+        dec_deg = coordinates.dec.deg
+        location = (observer_location.lat.deg, observer_location.lon.deg, observer_location.height.to_value(units.m))
+        jd1 = observation_times.utc.jd1
+        jd2 = observation_times.utc.jd2
+
+        shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * 8, 1))
+        try:
+            futures = []
+            for target, stars, samples in tasks:
+                futures.append(self.get_executor().submit(compute_chunk, shm.name, shape, target, ra_deg[stars],
+                                                          dec_deg[stars], jd1, jd2, location, self.engine_name,
+                                                          samples))
+            for future in futures:
+                future.result()
+
+            return np.ndarray(shape, dtype=np.float64, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+
+DEFAULT_RESULT_CACHE_SIZE = 32
+
+
+class ResultCache:
+    # Least recently used cache of per-night job results
+    def __init__(self, max_entries=DEFAULT_RESULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def freeze(value):
+    # Hashable version of the job dicts used in cache keys
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+
+    return value
@@ -0,0 +1,100 @@
+import numpy as np
+
+from ephemeris import jd_to_datetimes, jd_to_minute_offsets
+
+
+class TransitTable:
+    # Transits of a list of planets as flat arrays, grouped by planet in list order. Transit times are kept as
+    # Julian dates for exporting, and as whole minutes from the start of the night for everything else.
+    __slots__ = ["planet", "start_jds", "end_jds", "start_minutes", "end_minutes"]
+
+    def __init__(self, planet, start_jds, end_jds, start_minutes, end_minutes):
+        self.planet = planet
+        self.start_jds = start_jds
+        self.end_jds = end_jds
+        self.start_minutes = start_minutes
+        self.end_minutes = end_minutes
+
+    @staticmethod
+    def from_jds(planet, start_jds, end_jds, night_start_date):
+        return TransitTable(np.asarray(planet, dtype=np.int64), start_jds, end_jds,
+                            jd_to_minute_offsets(start_jds, night_start_date),
+                            jd_to_minute_offsets(end_jds, night_start_date))
+
+    def __len__(self):
+        return len(self.planet)
+
+    def take(self, positions):
+        # Transits at the given positions of the table, with their planet numbers unchanged
+        return TransitTable(self.planet[positions], self.start_jds[positions], self.end_jds[positions],
+                            self.start_minutes[positions], self.end_minutes[positions])
+
+    def select(self, planet_ids):
+        # Transits of the given planets, renumbered to their position in planet_ids
+        planet_ids = np.asarray(planet_ids, dtype=np.int64)
+        firsts = np.searchsorted(self.planet, planet_ids, side="left")
+        counts = np.searchsorted(self.planet, planet_ids, side="right") - firsts
+
+        positions = np.repeat(firsts - np.cumsum(counts) + counts, counts) + np.arange(np.sum(counts))
+
+        return TransitTable(np.repeat(np.arange(len(planet_ids)), counts), self.start_jds[positions],
+                            self.end_jds[positions], self.start_minutes[positions], self.end_minutes[positions])
+
+
+class ExoplanetResult:
+    # One planet of a night result: its catalog entry, its transits in the night (minute offsets and Julian
+    # dates, validity and observable fraction per transit) and its altitude over the night as a float32 row of
+    # the night's altitude block, on the time axis of the night result
+    __slots__ = ["details", "transit_start_minutes", "transit_end_minutes", "transit_start_jds", "transit_end_jds",
+                 "valid", "observable_fraction", "altitudes", "sort_key"]
+
+    def __init__(self, details, transit_start_minutes, transit_end_minutes, transit_start_jds, transit_end_jds,
+                 valid, observable_fraction, altitudes, sort_key):
+        self.details = details
+        self.transit_start_minutes = transit_start_minutes
+        self.transit_end_minutes = transit_end_minutes
+        self.transit_start_jds = transit_start_jds
+        self.transit_end_jds = transit_end_jds
+        self.valid = valid
+        self.observable_fraction = observable_fraction
+        self.altitudes = altitudes
+        self.sort_key = sort_key
+
+    def transit_count(self):
+        return len(self.transit_start_minutes)
+
+    def transit_datetimes(self):
+        # Naive UTC (start, end) datetimes of the transits
+        return list(zip(jd_to_datetimes(self.transit_start_jds), jd_to_datetimes(self.transit_end_jds)))
+
+
+def pack_altitude_rows(exoplanets, minutes):
+    # Moves the altitude rows of the results into one contiguous float32 block, the rows become views of it
+    block = np.zeros((len(exoplanets), minutes), dtype=np.float32)
+    for row in range(0, len(exoplanets)):
+        block[row] = exoplanets[row].altitudes
+        exoplanets[row].altitudes = block[row]
+
+    return block
+
+
+class MultiSiteResult:
+    # One planet of a multi-site night result: its transits in the night of any site and, per transit and site
+    # (columns in the order of the job observers), whether the site can observe it and its observable fraction.
+    # Sites whose night does not include a transit have it as not valid, with a zero fraction.
+    __slots__ = ["details", "transit_start_jds", "transit_end_jds", "site_valid", "site_observable_fraction",
+                 "sort_key"]
+
+    def __init__(self, details, transit_start_jds, transit_end_jds, site_valid, site_observable_fraction, sort_key):
+        self.details = details
+        self.transit_start_jds = transit_start_jds
+        self.transit_end_jds = transit_end_jds
+        self.site_valid = site_valid
+        self.site_observable_fraction = site_observable_fraction
+        self.sort_key = sort_key
+
+    def transit_count(self):
+        return len(self.transit_start_jds)
+
+    def transit_datetimes(self):
+        return list(zip(jd_to_datetimes(self.transit_start_jds), jd_to_datetimes(self.transit_end_jds)))
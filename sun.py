@@ -0,0 +1,77 @@
+import numpy as np
+
+# The true sun position is computed at nodes every SUN_NODE_MINUTES and interpolated to the minute grid.
+# Apparent right ascension, declination and sidereal time are smooth and interpolate to well below an
+# arcsecond over an hour, the altitude itself is then evaluated exactly for every minute from the hour angle.
+SUN_NODE_MINUTES = 60
+
+# Part of the altitude cache key, to be changed whenever the sun altitudes are computed differently
+SUN_MODEL_VERSION = 2
+
+# Sun altitudes (deg) at sunrise/sunset, accounting for refraction and the solar radius, and at the
+# end of civil, nautical and astronomical twilight
+TWILIGHT_LEVELS = {
+    "sun": -0.833,
+    "civil": -6,
+    "nautical": -12,
+    "astronomical": -18
+}
+
+
+def get_node_minutes(minutes, node_minutes=SUN_NODE_MINUTES):
+    return np.unique(np.append(np.arange(0, minutes, node_minutes), minutes - 1))
+
+
+def sun_altitudes(observation_times, observer_location, node_minutes=SUN_NODE_MINUTES):
+    from astropy.coordinates import get_sun, TETE
+
+    minutes = len(observation_times)
+    if minutes == 0:
+        return np.zeros(0)
+
+    nodes = get_node_minutes(minutes, node_minutes)
+    node_times = observation_times[nodes]
+
+    # Topocentric apparent place, so the solar parallax is included as in an AltAz transform
+    sun = get_sun(node_times).transform_to(TETE(obstime=node_times, location=observer_location))
+    lst = node_times.sidereal_time('apparent', longitude=observer_location.lon).rad
+
+    minute_grid = np.arange(0, minutes)
+    ra = np.interp(minute_grid, nodes, np.unwrap(sun.ra.rad))
+    dec = np.interp(minute_grid, nodes, sun.dec.rad)
+    lst = np.interp(minute_grid, nodes, np.unwrap(lst))
+
+    lat = observer_location.lat.rad
+    sin_alt = np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(lst - ra)
+
+    return np.degrees(np.arcsin(np.clip(sin_alt, -1, 1)))
+
+
+def get_crossings(sun_alt, level):
+    # Fractional minutes where the sun goes below (dusk) and comes back above (dawn) the given altitude
+    above = np.asarray(sun_alt) > level
+    changes = np.flatnonzero(above[1:] != above[:-1])
+
+    alt_before = sun_alt[changes]
+    alt_after = sun_alt[changes + 1]
+    crossings = changes + (alt_before - level) / (alt_before - alt_after)
+
+    going_down = above[changes]
+    return crossings[going_down], crossings[~going_down]
+
+
+def get_twilight_times(sun_alt):
+    twilight = {}
+    for name, level in TWILIGHT_LEVELS.items():
+        dusk, dawn = get_crossings(sun_alt, level)
+        twilight[name] = {"dusk": dusk, "dawn": dawn}
+
+    return twilight
+
+
+def get_dark_intervals(sun_alt, max_sun_altitude):
+    # Half-open [start, end) minute ranges where the sun is at or below max_sun_altitude
+    dark = np.concatenate([[False], np.asarray(sun_alt) <= max_sun_altitude, [False]])
+    changes = np.flatnonzero(dark[1:] != dark[:-1])
+
+    return changes[0::2], changes[1::2]
@@ -0,0 +1,61 @@
+import numpy as np
+
+
+def validate_transits(sample_altitudes, sample_sun_altitudes, sample_starts, sample_ends, min_altitude,
+                      max_sun_altitude, min_observable_fraction=1.0):
+    # Samples of transit i are sample_starts[i]:sample_ends[i]. A sample is observable when the star is high
+    # enough and the sun is low enough; a transit is valid when its observable fraction reaches
+    # min_observable_fraction, so the default only accepts transits observable for their whole duration.
+    observable = (np.asarray(sample_altitudes) >= min_altitude) & (np.asarray(sample_sun_altitudes) <= max_sun_altitude)
+
+    # Observable samples per transit as differences of a running count, which also handles empty ranges
+    running_count = np.concatenate([[0], np.cumsum(observable)])
+    sample_starts = np.asarray(sample_starts, dtype=np.int64)
+    sample_ends = np.asarray(sample_ends, dtype=np.int64)
+    observable_counts = running_count[sample_ends] - running_count[sample_starts]
+    sample_counts = sample_ends - sample_starts
+
+    # A transit with no samples in the window has nothing that can reject it
+    observable_fraction = np.ones(len(sample_counts))
+    has_samples = sample_counts > 0
+    observable_fraction[has_samples] = observable_counts[has_samples] / sample_counts[has_samples]
+
+    if min_observable_fraction >= 1:
+        valid = observable_counts == sample_counts
+    else:
+        valid = observable_fraction >= min_observable_fraction
+
+    return valid, observable_fraction
+
+
+def any_valid_per_planet(transit_planet, valid, planet_count):
+    return np.bincount(transit_planet, weights=valid, minlength=planet_count) > 0
+
+
+def interval_overlaps(range_starts, range_ends, interval_starts, interval_ends):
+    # Length of every [range_start, range_end) covered by the sorted, disjoint [interval_start, interval_end)
+    covered_before = np.concatenate([[0], np.cumsum(interval_ends - interval_starts)])
+
+    def covered_until(x):
+        # Intervals ending at or before x are fully covered, the next one may be partially
+        complete = np.searchsorted(interval_ends, x, side='right')
+        partial = np.zeros(len(x), dtype=np.int64)
+        in_interval = complete < len(interval_starts)
+        partial[in_interval] = np.maximum(x[in_interval] - interval_starts[complete[in_interval]], 0)
+
+        return covered_before[complete] + partial
+
+    return covered_until(np.asarray(range_ends)) - covered_until(np.asarray(range_starts))
+
+
+def possibly_valid_per_planet(transit_planet, dark_counts, sample_counts, planet_count, min_observable_fraction=1.0):
+    # Upper bound of validate_transits from the sun alone: the star altitude can only remove observable samples
+    if min_observable_fraction >= 1:
+        possible = dark_counts == sample_counts
+    else:
+        fraction = np.ones(len(sample_counts))
+        has_samples = sample_counts > 0
+        fraction[has_samples] = dark_counts[has_samples] / sample_counts[has_samples]
+        possible = fraction >= min_observable_fraction
+
+    return any_valid_per_planet(transit_planet, possible, planet_count)
@@ -1,5 +1,23 @@
 import time
 
+# Reference for the startup phases, utils is the first module imported by main
+STARTUP_TIME = time.time()
+startup_phases = {}
+
+def mark_startup_phase(name):
+    # Logs the time since startup the first time a phase is reached
+    if name not in startup_phases:
+        startup_phases[name] = time.time() - STARTUP_TIME
+        print("Startup: %s after %.2f seconds" % (name, startup_phases[name]))
+
+
+def spawn_process_pool(workers):
+    # Workers are spawned, forking a process that runs Qt and other threads is not safe
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
 
 class Timer:
     def __init__(self, name):
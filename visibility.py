@@ -0,0 +1,43 @@
+import numpy as np
+
+from ephemeris import J2000_JD
+
+# Geometric altitudes from catalog coordinates and mean sidereal time are within a fraction of a degree of the
+# apparent ones (precession since J2000, nutation, aberration), stars are only rejected below this margin
+PRESCREEN_MARGIN_DEG = 1.0
+
+# Greenwich mean sidereal time (IAU 1982, in degrees) at J2000 and its rate per day
+GMST_J2000_DEG = 280.46061837
+GMST_RATE_DEG = 360.98564736629
+
+
+def local_sidereal_time(jd, lon_deg):
+    return np.radians(GMST_J2000_DEG + GMST_RATE_DEG * (np.asarray(jd) - J2000_JD) + lon_deg)
+
+
+def altitude_at_hour_angle(hour_angle, dec, lat):
+    sin_alt = np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(hour_angle)
+    return np.degrees(np.arcsin(np.clip(sin_alt, -1, 1)))
+
+
+def max_altitudes(ra_deg, dec_deg, lat_deg, lon_deg, interval_start_jds, interval_end_jds):
+    # Highest geometric altitude of every star during any of the [start, end] time intervals. The altitude only
+    # decreases with the distance of the hour angle from the meridian, so it is the meridian altitude when the
+    # star crosses the meridian inside an interval, and the altitude at one of the interval ends otherwise.
+    ra = np.radians(np.asarray(ra_deg))
+    dec = np.radians(np.asarray(dec_deg))
+    lat = np.radians(lat_deg)
+    meridian_altitude = 90 - np.abs(lat_deg - np.asarray(dec_deg))
+
+    best = np.full(len(ra), -90.0)
+    for start_jd, end_jd in zip(interval_start_jds, interval_end_jds):
+        hour_angle_start = np.mod(local_sidereal_time(start_jd, lon_deg) - ra + np.pi, 2 * np.pi) - np.pi
+        hour_angle_end = hour_angle_start + np.radians(GMST_RATE_DEG * (end_jd - start_jd))
+
+        crosses_meridian = ((hour_angle_start <= 0) & (hour_angle_end >= 0)) | (hour_angle_end >= 2 * np.pi)
+        edge_altitude = np.maximum(altitude_at_hour_angle(hour_angle_start, dec, lat),
+                                   altitude_at_hour_angle(hour_angle_end, dec, lat))
+
+        best = np.maximum(best, np.where(crosses_meridian, meridian_altitude, edge_altitude))
+
+    return best
@@ -1,10 +1,12 @@
 from PyQt6 import QtCore
 from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QLabel, QHBoxLayout, QPushButton, \
-    QListWidget, QListWidgetItem
+    QListWidget, QListWidgetItem, QSpinBox
 from PyQt6.QtGui import QFont
 
 import datetime
 
+MAX_NIGHTS = 60
+
 class DaySelectorWidget(QWidget):
     def __init__(self, parent_widget, *args, **kwargs):
         super(DaySelectorWidget, self).__init__(*args, **kwargs)
@@ -19,7 +21,13 @@ class DaySelectorWidget(QWidget):
 
         self.selected_date = datetime.datetime.now()
 
-        self.day_label = QLabel(self.selected_date.strftime("%d %B %Y"))
+        self.nights_input = QSpinBox()
+        self.nights_input.setRange(1, MAX_NIGHTS)
+        self.nights_input.setPrefix("Nights: ")
+        self.nights_input.setFixedWidth(100)
+        self.nights_input.valueChanged.connect(self.on_nights_changed)
+
+        self.day_label = QLabel(self.get_range_text())
         self.day_label.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
         self.day_label.setFixedHeight(20)
 
@@ -30,6 +38,7 @@ class DaySelectorWidget(QWidget):
         layout.addStretch()
         layout.addWidget(self.day_label, QtCore.Qt.AlignmentFlag.AlignCenter)
         layout.addStretch()
+        layout.addWidget(self.nights_input)
         layout.addWidget(self.next_button, QtCore.Qt.AlignmentFlag.AlignRight)
 
         self.setLayout(layout)
@@ -37,6 +46,16 @@ class DaySelectorWidget(QWidget):
     def get_selected_date(self):
         return self.selected_date
 
+    def get_selected_nights(self):
+        return self.nights_input.value()
+
+    def get_range_text(self):
+        if self.nights_input.value() == 1:
+            return self.selected_date.strftime("%d %B %Y")
+
+        last_date = self.selected_date + datetime.timedelta(days=self.nights_input.value() - 1)
+        return "%s - %s" % (self.selected_date.strftime("%d %B %Y"), last_date.strftime("%d %B %Y"))
+
     def prev_day(self):
         self.selected_date = self.selected_date - datetime.timedelta(days=1)
         self.on_date_changed()
@@ -46,9 +65,8 @@ class DaySelectorWidget(QWidget):
         self.on_date_changed()
 
     def on_date_changed(self):
-        self.day_label.setText(self.selected_date.strftime("%d %B %Y"))
+        self.day_label.setText(self.get_range_text())
         self.parent_widget.on_date_changed()
 
-    def set_enable_buttons(self, enabled):
-        self.prev_button.setEnabled(enabled)
-        self.next_button.setEnabled(enabled)
\ No newline at end of file
+    def on_nights_changed(self):
+        self.day_label.setText(self.get_range_text())
\ No newline at end of file
@@ -5,6 +5,7 @@ from PyQt6.QtGui import QFont
 
 import datetime
 
+from utils import mark_startup_phase
 from widgets.transit_selector_widget import TransitSelectorWidget
 from widgets.transit_filters_widget import TransitFiltersWidget
 
@@ -18,6 +19,8 @@ class MainWidget(QWidget):
         self.setFixedHeight(900)
 
         self.new_data.connect(self.refresh_transits)
+        self.result_count = 0
+        self.current_job_id = None
 
         layout = QHBoxLayout()
 
@@ -39,12 +42,13 @@ class MainWidget(QWidget):
 
     def trigger_recompute_transits(self):
         start_date = self.transit_selector_widget.get_selected_date()
-        end_date = start_date + datetime.timedelta(days=1)
+        end_date = start_date + datetime.timedelta(days=self.transit_selector_widget.get_selected_nights())
 
         observer_data = self.transit_filters_widget.get_observer_data()
         filters_data = self.transit_filters_widget.get_filters_data()
 
         self.transit_selector_widget.update_info_data({'progress': 0, 'info': "Searching"})
+        self.result_count = 0
 
         request = {
             "start_date": start_date,
@@ -52,19 +56,37 @@ class MainWidget(QWidget):
             "observer": observer_data,
             "filters": filters_data
         }
+        request.update(self.transit_filters_widget.get_engine_data())
 
         print("Starting job for request: %s" % request)
 
         self.transit_selector_widget.on_refresh_triggered()
-        self.transit_filters_widget.on_refresh_triggered()
 
-        self.frontend_thread.request_backend_job(request)
+        # Navigation stays enabled, a newer request supersedes this one and its results are ignored
+        self.current_job_id = self.frontend_thread.request_backend_job(request)
 
     def refresh_transits(self, result):
-        print("Got result. %d transits found" % (len(result["exoplanets"])))
-        self.transit_selector_widget.update_info_data({'progress': 70, 'info': "Generating Plots"})
+        # Called for every batch of results streamed by the backend, and once more when a night is done
+        if result.get("job_id") != self.current_job_id:
+            return
+
+        night_index = result.get("night_index", 0)
+        night_count = result.get("night_count", 1)
+
+        if len(result["exoplanets"]) > 0 or result.get("night_done", True):
+            mark_startup_phase("First results")
+
+        if len(result["exoplanets"]) > 0:
+            print("Got result. %d transits found" % (len(result["exoplanets"])))
+        self.result_count += len(result["exoplanets"])
         self.transit_selector_widget.refresh_transits(result)
-        self.transit_selector_widget.update_info_data({'progress': 100, 'info': "Results: %d" % len(result["exoplanets"])})
 
-        self.transit_selector_widget.on_refresh_completed()
-        self.transit_filters_widget.on_refresh_completed()
\ No newline at end of file
+        if night_index + 1 < night_count or not result.get("night_done", True):
+            progress = (night_index + result.get("night_progress", 1.0)) / night_count
+            self.transit_selector_widget.update_info_data({'progress': 100 * progress,
+                                                           'info': "Night %d/%d, %s, results: %d" % (
+                                                               night_index + 1, night_count,
+                                                               result.get("stage", "searching"), self.result_count)})
+            return
+
+        self.transit_selector_widget.update_info_data({'progress': 100, 'info': "Results: %d" % self.result_count})
\ No newline at end of file
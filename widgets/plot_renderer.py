@@ -0,0 +1,58 @@
+from PyQt6 import QtCore
+
+from utils import spawn_process_pool
+
+class PlotRenderer(QtCore.QObject):
+    # Rasterizes transit plots with Agg in worker processes. plot_rendered(key, (rgba, width, height)) is
+    # emitted when a plot is done, or plot_rendered(key, None) when it failed; the signal is delivered on the
+    # GUI thread, the futures complete on an executor thread.
+    plot_rendered = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, workers, *args, **kwargs):
+        super(PlotRenderer, self).__init__(*args, **kwargs)
+
+        self.workers = workers
+        self.executor = None
+        self.pending = {}
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = spawn_process_pool(self.workers)
+
+        return self.executor
+
+    def render(self, key, plot_args):
+        if key in self.pending:
+            return
+
+        from widgets.transit_plot import render_plot_rgba
+        future = self.get_executor().submit(render_plot_rgba, *plot_args)
+        self.pending[key] = future
+        future.add_done_callback(lambda done: self.on_future_done(key, done))
+
+    def on_future_done(self, key, future):
+        if future.cancelled():
+            return
+
+        try:
+            rendered = future.result()
+        except Exception as e:
+            print("Plot rendering failed: %s" % e)
+            rendered = None
+
+        self.plot_rendered.emit(key, rendered)
+
+    def finish(self, key):
+        self.pending.pop(key, None)
+
+    def cancel_pending(self):
+        # Plots of rows that are gone are not needed anymore, the ones already running finish anyway
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+
+    def shutdown(self):
+        self.cancel_pending()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
@@ -3,6 +3,13 @@ from PyQt6 import QtCore
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout, QLineEdit, QPushButton, QComboBox
 from PyQt6.QtGui import QIntValidator,QDoubleValidator
 
+# Display name -> (engine, compare against astropy on a sample of stars)
+ALTAZ_ENGINE_OPTIONS = {
+    "Accurate": ("astropy", False),
+    "Fast": ("fast", False),
+    "Fast (validated)": ("fast", True)
+}
+
 class InputWidget(QWidget):
     def __init__(self, name, default_value="", validator=None, *args, **kwargs):
         super(InputWidget, self).__init__(*args, **kwargs)
@@ -82,6 +89,18 @@ class TransitFiltersWidget(QWidget):
         self.order_layout.setContentsMargins(0, 10, 10, 10)
 
         layout.addLayout(self.order_layout)
+
+        self.engine_layout = QHBoxLayout()
+
+        self.engine_layout.addWidget(QLabel("Alt/Az Engine"))
+
+        self.engine_widget = QComboBox()
+        for engine_name in ALTAZ_ENGINE_OPTIONS:
+            self.engine_widget.addItem(engine_name)
+        self.engine_layout.addWidget(self.engine_widget)
+        self.engine_layout.setContentsMargins(0, 10, 10, 10)
+
+        layout.addLayout(self.engine_layout)
         layout.addWidget(self.refresh_button)
 
         self.setLayout(layout)
@@ -120,8 +139,7 @@ class TransitFiltersWidget(QWidget):
 
         return data
 
-    def on_refresh_triggered(self):
-        self.refresh_button.setEnabled(False)
+    def get_engine_data(self):
+        engine, validate = ALTAZ_ENGINE_OPTIONS[self.engine_widget.currentText()]
 
-    def on_refresh_completed(self):
-        self.refresh_button.setEnabled(True)
\ No newline at end of file
+        return {"altaz_engine": engine, "validate_altaz_engine": validate}
@@ -1,100 +1,276 @@
 from PyQt6 import QtCore
-from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QLabel, QHBoxLayout, QPushButton, \
-    QListWidget, QListWidgetItem
-from PyQt6.QtGui import QFont
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QListView, QStyledItemDelegate, QAbstractItemView
+from PyQt6.QtGui import QImage, QPixmap, QDesktopServices, QColor
 
-from widgets.transit_plot_widget import TransitPlotWidget
+from widgets.plot_renderer import PlotRenderer
+from result_cache import ResultCache, freeze
+import bisect
 import datetime
 
 import urllib
 
 ETD_ROOT = 'http://var2.astro.cz/ETD/'
 ETD_PREDICT_URL = ETD_ROOT + "predict_detail.php"
+ETD_LINK_TEXT = "More Details - ETD Link"
 
-class TransitListWidgetItem(QWidget):
-    def __init__(self, transit_data, result_data, *args, **kwargs):
-        super(TransitListWidgetItem, self).__init__(*args, **kwargs)
+PLOT_WIDTH = 400
+PLOT_HEIGHT = 300
+INFO_WIDTH = 450
+ROW_MARGIN = 10
+# Rendered plots kept around, enough for the visible rows and some scrolling back and forth
+PLOT_CACHE_SIZE = 24
+PLOT_PENDING_TEXT = "Rendering plot..."
 
-        start_date = result_data["start_date"]
-        end_date = result_data["end_date"]
-        observer_tz = result_data["observer_timezone"]
-        observer_lon = result_data["observer"]["lon"]
-        observer_lat = result_data["observer"]["lat"]
-        sun_alt_graph = result_data["sun_alt_graph"]
+def rgba_to_pixmap(rendered):
+    data, width, height = rendered
+    return QPixmap.fromImage(QImage(data, width, height, QImage.Format.Format_RGBA8888).copy())
 
-        local_start_date = start_date.replace(tzinfo=datetime.timezone.utc).astimezone(observer_tz)
-        local_end_date = end_date.replace(tzinfo=datetime.timezone.utc).astimezone(observer_tz)
+class TransitRow:
+    # Everything one list row shows, the info lines are formatted once when the row is added
+    def __init__(self, transit_data, result_data, sort_key, sky_background):
+        self.transit_data = transit_data
+        self.result_data = result_data
+        self.sort_key = sort_key
+        self.sky_background = sky_background
+        self.info_lines, self.etd_link = self.build_info_lines()
+        # The plot depends only on the planet, the night and the observer
+        self.plot_key = (transit_data.details["id"], result_data["start_date"],
+                         freeze(result_data["observer"]))
+
+    def build_info_lines(self):
+        details = self.transit_data.details
+        observer_tz = self.result_data["observer_timezone"]
+
+        lines = ["Star: %s" % details['star'],
+                 "Planet: %s" % details['planet'],
+                 "RA: %d h %d m %.2f s" % (details['ra'][0], details['ra'][1], details['ra'][2]),
+                 "DEC: %d° %d' %.2f''" % (details['dec'][0], details['dec'][1], details['dec'][2]),
+                 "Mag: %s" % details['mag'],
+                 "Transit Delta Mag: %s" % details["transit_dv"],
+                 "Transit Duration: %s mins" % details["duration"]]
 
-        self.pltWidget = TransitPlotWidget(self, width=4, height=3, dpi=100)
-        self.pltWidget.create_plot(transit_data, sun_alt_graph, local_start_date, local_end_date, observer_tz)
-
-        layout = QHBoxLayout()
-
-        starInfoLayout = QVBoxLayout()
-        starInfoLayout.setAlignment(QtCore.Qt.AlignmentFlag.AlignTop)
-        starInfoLayout.addWidget(QLabel("Star: %s" % transit_data["exoplanet_details"]['star']))
-        starInfoLayout.addWidget(QLabel("Planet: %s" % transit_data["exoplanet_details"]['planet']))
-        starInfoLayout.addWidget(QLabel("RA: %d h %d m %.2f s" % (transit_data["exoplanet_details"]['ra'][0],
-                                                                transit_data["exoplanet_details"]['ra'][1],
-                                                                transit_data["exoplanet_details"]['ra'][2])
-                                        )
-                                 )
-
-        starInfoLayout.addWidget(QLabel("DEC: %d° %d' %.2f''" % (transit_data["exoplanet_details"]['dec'][0],
-                                                                   transit_data["exoplanet_details"]['dec'][1],
-                                                                   transit_data["exoplanet_details"]['dec'][2])
-                                        )
-                                 )
-        starInfoLayout.addWidget(QLabel("Mag: %s" % transit_data["exoplanet_details"]['mag']))
-        starInfoLayout.addWidget(QLabel("Transit Delta Mag: %s" % transit_data["exoplanet_details"]["transit_dv"]))
-        starInfoLayout.addWidget(QLabel("Transit Duration: %s mins" % transit_data["exoplanet_details"]["duration"]))
-
-        total_seconds = datetime.timedelta(transit_data["exoplanet_details"]["period"]).total_seconds()
+        total_seconds = datetime.timedelta(details["period"]).total_seconds()
         pdays = total_seconds // 86400
         phours = (total_seconds - pdays * 86400) // 3600
         pminutes = (total_seconds - pdays * 86400 - phours * 3600) // 60
-        starInfoLayout.addWidget(QLabel("Transit Period: %d days %d hours %d minutes" % (pdays, phours, pminutes)))
+        lines.append("Transit Period: %d days %d hours %d minutes" % (pdays, phours, pminutes))
 
-        etd_link = ETD_PREDICT_URL + "?" + urllib.parse.urlencode({"STARNAME": transit_data["exoplanet_details"]["star"],
-                                                                   "PLANET": transit_data["exoplanet_details"]["planet"],
+        etd_link = ETD_PREDICT_URL + "?" + urllib.parse.urlencode({"STARNAME": details["star"],
+                                                                   "PLANET": details["planet"],
                                                                    'submit': 'submit',
-                                                                   'delka': observer_lon, 'sirka': observer_lat})
-        link_label = QLabel()
-        link_label.setText('<a href="%s">More Details - ETD Link</a>' % etd_link)
-        link_label.setOpenExternalLinks(True)
-        starInfoLayout.addWidget(link_label)
-
-        for i in range(0, len(transit_data["transits"])):
-            transit = transit_data["transits"][i]
-            start = transit["start"].replace(tzinfo=datetime.timezone.utc).astimezone(observer_tz)
-            end = transit["end"].replace(tzinfo=datetime.timezone.utc).astimezone(observer_tz)
-            transit_label = QLabel("Transit: %s - %s" % (start.strftime("%H:%M %d.%m.%Y"), end.strftime("%H:%M %d.%m.%Y")))
-            starInfoLayout.addWidget(transit_label)
-
-        layout.addLayout(starInfoLayout)
-        layout.addWidget(self.pltWidget)
+                                                                   'delka': self.result_data["observer"]["lon"],
+                                                                   'sirka': self.result_data["observer"]["lat"]})
+        lines.append(ETD_LINK_TEXT)
 
-        self.setLayout(layout)
+        transit_dates = self.transit_data.transit_datetimes()
+        for transit_id in range(0, len(transit_dates)):
+            start = transit_dates[transit_id][0].replace(tzinfo=datetime.timezone.utc).astimezone(observer_tz)
+            end = transit_dates[transit_id][1].replace(tzinfo=datetime.timezone.utc).astimezone(observer_tz)
+            lines.append("Transit: %s - %s (%d%% observable)" % (start.strftime("%H:%M %d.%m.%Y"),
+                                                                 end.strftime("%H:%M %d.%m.%Y"),
+                                                                 100 * self.transit_data.observable_fraction[transit_id]))
 
-class TransitListWidget(QWidget):
+        return lines, etd_link
+
+    def get_plot_args(self):
+        start_date = self.result_data["start_date"]
+        end_date = self.result_data["end_date"]
+        observer_tz = self.result_data["observer_timezone"]
+
+        local_start_date = start_date.replace(tzinfo=datetime.timezone.utc).astimezone(observer_tz)
+        local_end_date = end_date.replace(tzinfo=datetime.timezone.utc).astimezone(observer_tz)
+
+        return (self.transit_data, self.result_data["sun_alt_graph"], local_start_date, local_end_date, observer_tz,
+                self.sky_background, PLOT_WIDTH / 100, PLOT_HEIGHT / 100, 100)
+
+    def render_plot(self):
+        # Matplotlib is imported on first use, it is usually warmed up in the background by then
+        from widgets.transit_plot import render_plot_rgba
+
+        return rgba_to_pixmap(render_plot_rgba(*self.get_plot_args()))
+
+class TransitListModel(QtCore.QAbstractListModel):
     def __init__(self, *args, **kwargs):
+        super(TransitListModel, self).__init__(*args, **kwargs)
+
+        # Rows are kept sorted by sort key, results arrive in batches and are inserted at their position
+        self.rows = []
+        self.sort_keys = []
+        # The sky shading depends only on the night, rows of the same night share it
+        self.sky_backgrounds = {}
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row = self.rows[index.row()]
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return "%s %s" % (row.transit_data.details["star"], row.transit_data.details["planet"])
+        if role == QtCore.Qt.ItemDataRole.UserRole:
+            return row
+
+        return None
+
+    def insert_transit(self, transit_data, result_data):
+        # Nights stay grouped, rows of the same night follow the backend ordering
+        sort_key = (result_data.get("night_index", 0), transit_data.sort_key)
+        position = bisect.bisect_right(self.sort_keys, sort_key)
+
+        self.beginInsertRows(QtCore.QModelIndex(), position, position)
+        self.sort_keys.insert(position, sort_key)
+        self.rows.insert(position, TransitRow(transit_data, result_data, sort_key,
+                                              self.get_sky_background(result_data)))
+        self.endInsertRows()
+
+    def get_sky_background(self, result_data):
+        night = result_data["start_date"]
+        if night not in self.sky_backgrounds:
+            from widgets.transit_plot import SkyBackground
+            self.sky_backgrounds[night] = SkyBackground(result_data["sun_alt_graph"]["y"])
+
+        return self.sky_backgrounds[night]
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows = []
+        self.sort_keys = []
+        self.sky_backgrounds = {}
+        self.endResetModel()
+
+class TransitRowDelegate(QStyledItemDelegate):
+    # Paints rows straight from the model: only visible rows are painted, and their plots are rendered on
+    # first paint into a bounded pixmap cache, so rows scrolled out of view give their pixmap back.
+    # With plot_workers the plots are rasterized in worker processes and painted once they arrive.
+    plot_ready = QtCore.pyqtSignal()
+
+    def __init__(self, *args, plot_workers=0, **kwargs):
+        super(TransitRowDelegate, self).__init__(*args, **kwargs)
+
+        self.plot_cache = ResultCache(PLOT_CACHE_SIZE)
+        self.failed_plots = set()
+
+        self.plot_renderer = None
+        if plot_workers > 0:
+            self.plot_renderer = PlotRenderer(plot_workers, self)
+            self.plot_renderer.plot_rendered.connect(self.on_plot_rendered)
+
+    def get_plot(self, row):
+        # Returns None while the plot is being rendered in the background
+        pixmap = self.plot_cache.get(row.plot_key)
+        if pixmap is not None:
+            return pixmap
+
+        if self.plot_renderer is None or row.plot_key in self.failed_plots:
+            pixmap = row.render_plot()
+            self.plot_cache.put(row.plot_key, pixmap)
+        else:
+            self.plot_renderer.render(row.plot_key, row.get_plot_args())
+
+        return pixmap
+
+    def on_plot_rendered(self, key, rendered):
+        self.plot_renderer.finish(key)
+        if rendered is None:
+            # Drawn on the GUI thread the next time the row is painted
+            self.failed_plots.add(key)
+        else:
+            self.plot_cache.put(key, rgba_to_pixmap(rendered))
+
+        self.plot_ready.emit()
+
+    def sizeHint(self, option, index):
+        row = index.data(QtCore.Qt.ItemDataRole.UserRole)
+        text_height = len(row.info_lines) * option.fontMetrics.height()
+
+        return QtCore.QSize(INFO_WIDTH + PLOT_WIDTH + 3 * ROW_MARGIN, max(text_height, PLOT_HEIGHT) + 2 * ROW_MARGIN)
+
+    def get_link_rect(self, option_rect, font_metrics, row):
+        line_height = font_metrics.height()
+        link_line = row.info_lines.index(ETD_LINK_TEXT)
+
+        return QtCore.QRect(option_rect.x() + ROW_MARGIN, option_rect.y() + ROW_MARGIN + link_line * line_height,
+                            font_metrics.horizontalAdvance(ETD_LINK_TEXT), line_height)
+
+    def paint(self, painter, option, index):
+        row = index.data(QtCore.Qt.ItemDataRole.UserRole)
+        rect = option.rect
+
+        painter.save()
+
+        line_height = option.fontMetrics.height()
+        for line_id in range(0, len(row.info_lines)):
+            line = row.info_lines[line_id]
+            if line == ETD_LINK_TEXT:
+                painter.setPen(option.palette.link().color())
+            else:
+                painter.setPen(option.palette.text().color())
+
+            painter.drawText(QtCore.QRect(rect.x() + ROW_MARGIN, rect.y() + ROW_MARGIN + line_id * line_height,
+                                          INFO_WIDTH, line_height),
+                             QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignVCenter, line)
+
+        plot_rect = QtCore.QRect(rect.x() + INFO_WIDTH + 2 * ROW_MARGIN, rect.y() + ROW_MARGIN, PLOT_WIDTH, PLOT_HEIGHT)
+        pixmap = self.get_plot(row)
+        if pixmap is not None:
+            painter.drawPixmap(plot_rect.topLeft(), pixmap)
+        else:
+            painter.setPen(option.palette.text().color())
+            painter.drawText(plot_rect, QtCore.Qt.AlignmentFlag.AlignCenter, PLOT_PENDING_TEXT)
+
+        painter.setPen(QColor(128, 128, 128))
+        painter.drawLine(rect.bottomLeft(), rect.bottomRight())
+
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        # The ETD link is painted as text, clicks on it open the browser
+        if event.type() == QtCore.QEvent.Type.MouseButtonRelease:
+            row = index.data(QtCore.Qt.ItemDataRole.UserRole)
+            if self.get_link_rect(option.rect, option.fontMetrics, row).contains(event.position().toPoint()):
+                QDesktopServices.openUrl(QtCore.QUrl(row.etd_link))
+                return True
+
+        return super(TransitRowDelegate, self).editorEvent(event, model, option, index)
+
+    def clear(self):
+        # Cached plots stay valid for the same planet, night and observer, only queued renders are dropped
+        if self.plot_renderer is not None:
+            self.plot_renderer.cancel_pending()
+
+    def shutdown(self):
+        if self.plot_renderer is not None:
+            self.plot_renderer.shutdown()
+
+class TransitListWidget(QWidget):
+    def __init__(self, *args, plot_workers=0, **kwargs):
         super(TransitListWidget, self).__init__(*args, **kwargs)
 
         layout = QVBoxLayout()
 
-        self.list_widget = QListWidget(self)
+        self.model = TransitListModel(self)
+        self.delegate = TransitRowDelegate(self, plot_workers=plot_workers)
+
+        self.list_view = QListView(self)
+        self.list_view.setModel(self.model)
+        self.list_view.setItemDelegate(self.delegate)
+        self.list_view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.list_view.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
 
-        layout.addWidget(self.list_widget)
+        self.delegate.plot_ready.connect(self.list_view.viewport().update)
+
+        layout.addWidget(self.list_view)
 
         self.setLayout(layout)
 
     def addTransit(self, transit_data, result_data):
-        item = QListWidgetItem(self.list_widget)
-        itemWidget = TransitListWidgetItem(transit_data, result_data)
-        item.setSizeHint(itemWidget.sizeHint())
-
-        self.list_widget.addItem(item)
-        self.list_widget.setItemWidget(item, itemWidget)
+        self.model.insert_transit(transit_data, result_data)
 
     def clearTransits(self):
-        self.list_widget.clear()
\ No newline at end of file
+        self.model.clear()
+        self.delegate.clear()
+
+    def shutdown(self):
+        self.delegate.shutdown()
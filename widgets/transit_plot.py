@@ -0,0 +1,113 @@
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+from matplotlib.colors import LinearSegmentedColormap, to_rgba
+from matplotlib.ticker import Formatter, FixedLocator
+import numpy as np
+
+import datetime
+
+class TimeFormatter(Formatter):
+    def __init__(self, start_date):
+        self.start_date = start_date
+
+    def __call__(self, x, pos):
+        date = self.start_date + datetime.timedelta(minutes=int(x))
+        return date.strftime("%H:%M")
+
+SKY_DAY_COLOR = (173 / 255, 216 / 255, 230 / 255)
+SKY_NIGHT_COLOR = (5 / 255, 5 / 255, 35 / 255)
+SKY_COLOR_MAP = LinearSegmentedColormap.from_list("sky", [SKY_DAY_COLOR, SKY_NIGHT_COLOR])
+
+TRANSIT_COLOR = to_rgba("red")
+OUT_OF_TRANSIT_COLOR = to_rgba("blue")
+
+class SkyBackground:
+    # Sky shading of one night: day above 5 degrees of sun altitude, night below -5 and a linear blend
+    # in between. It is the same for every planet of the night, so it is computed once and drawn on each plot.
+    def __init__(self, sun_alt):
+        t = np.clip((np.asarray(sun_alt[1:], dtype=np.float64) + 5) / 10, 0, 1)
+        self.shades = 1 - (SKY_DAY_COLOR[1] * t + SKY_NIGHT_COLOR[1] * (1 - t))
+
+    def draw(self, axes):
+        # One pixel column per minute, colored through the same normalized map as the former patches
+        axes.imshow(self.shades[np.newaxis, :], cmap=SKY_COLOR_MAP, aspect='auto', interpolation='nearest',
+                    origin='lower', extent=(0, len(self.shades), -90, 90))
+
+class TransitPlot:
+    # Altitude chart of one planet over the night, drawn on self.fig / self.axes. Has no Qt dependency,
+    # the figure can be shown by a Qt canvas or rasterized with Agg.
+
+    # Axes, ticks and labels are the same on every chart, so the tight layout is computed once per figure size
+    tight_layouts = {}
+
+    def get_transit_mask(self, transit_start_minutes, transit_end_minutes, minutes):
+        # Minute i of the night is in transit when it falls inside one of the transits, whose start and end are
+        # whole minutes truncated from the exact times
+        in_transit = np.zeros(len(minutes), dtype=bool)
+        for transit_start, transit_end in zip(transit_start_minutes, transit_end_minutes):
+            in_transit |= (minutes > transit_start) & (minutes <= transit_end)
+
+        return in_transit
+
+    def create_plot(self, transit_data, sun_alt_graph, start_date, end_date, observer_tz, sky_background=None):
+        # The altitudes of the planet are on the minute axis of the sun graph
+        points = np.column_stack([sun_alt_graph["x"], transit_data.altitudes])
+        in_transit = self.get_transit_mask(transit_data.transit_start_minutes, transit_data.transit_end_minutes,
+                                           np.arange(1, len(points)))
+
+        # Segment i joins points i and i + 1, consecutive segments of the same color are drawn as one line
+        run_starts = np.concatenate([[0], np.flatnonzero(np.diff(in_transit)) + 1])
+        run_ends = np.append(run_starts[1:], len(in_transit))
+        segments = [points[start:end + 1] for start, end in zip(run_starts, run_ends)]
+        colors = np.where(in_transit[run_starts, np.newaxis], TRANSIT_COLOR, OUT_OF_TRANSIT_COLOR)
+
+        if sky_background is None:
+            sky_background = SkyBackground(sun_alt_graph["y"])
+
+        self.axes.add_collection(LineCollection(segments, colors=colors))
+        sky_background.draw(self.axes)
+        self.axes.set_ylim(0, 90)
+        self.axes.set_xlim(0, 1440)
+        self.axes.xaxis.set_major_formatter(TimeFormatter(start_date))
+        self.axes.xaxis.set_major_locator(FixedLocator(np.arange(0, 1440, 60)))
+        self.axes.yaxis.set_major_locator(FixedLocator(np.arange(0, 100, 10)))
+        self.axes.tick_params(axis='x', labelrotation=45)
+
+        self.apply_tight_layout()
+
+    def apply_tight_layout(self):
+        layout_key = (tuple(self.fig.get_size_inches()), self.fig.dpi)
+        layout = TransitPlot.tight_layouts.get(layout_key)
+        if layout is None:
+            self.fig.tight_layout()
+            params = self.fig.subplotpars
+            layout = (params.left, params.bottom, params.right, params.top)
+            TransitPlot.tight_layouts[layout_key] = layout
+
+        self.fig.subplots_adjust(*layout)
+
+    def create_figure(self, width, height, dpi):
+        self.fig = Figure(figsize=(width, height), dpi=dpi)
+        self.axes = self.fig.add_subplot(111)
+        self.fig.set_facecolor('#75a8f6')
+
+class TransitPlotImage(TransitPlot):
+    # Renders the chart with Agg into an RGBA buffer, without any Qt canvas
+    def __init__(self, width=4, height=3, dpi=100):
+        self.create_figure(width, height, dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+
+    def render_rgba(self):
+        self.canvas.draw()
+        buffer = self.canvas.buffer_rgba()
+
+        return bytes(buffer), buffer.shape[1], buffer.shape[0]
+
+def render_plot_rgba(transit_data, sun_alt_graph, start_date, end_date, observer_tz, sky_background=None,
+                     width=4, height=3, dpi=100):
+    # Module level so it can run in a worker process, returns (RGBA bytes, width, height)
+    plot = TransitPlotImage(width=width, height=height, dpi=dpi)
+    plot.create_plot(transit_data, sun_alt_graph, start_date, end_date, observer_tz, sky_background)
+
+    return plot.render_rgba()
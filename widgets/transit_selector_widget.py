@@ -24,7 +24,7 @@ class TransitSelectorInfoWidget(QWidget):
 
     def update_data(self, data):
         self.resultsLabel.setText(data.get("info", ""))
-        self.progress_bar.setValue(data.get("progress", 0))
+        self.progress_bar.setValue(int(data.get("progress", 0)))
 
 class TransitSelectorWidget(QWidget):
     def __init__(self, parent_widget, *args, **kwargs):
@@ -37,7 +37,7 @@ class TransitSelectorWidget(QWidget):
         layout = QVBoxLayout()
 
         self.current_page = 0
-        self.transit_list_widget = TransitListWidget()
+        self.transit_list_widget = TransitListWidget(plot_workers=parent_widget.frontend_thread.plot_workers)
         self.day_selector_widget = DaySelectorWidget(self)
         self.info_widget = TransitSelectorInfoWidget()
 
@@ -50,16 +50,17 @@ class TransitSelectorWidget(QWidget):
         self.setLayout(layout)
 
     def refresh_transits(self, data):
-        self.transit_list_widget.clearTransits()
-
+        # Results arrive in batches, the list is cleared when the job is triggered
         with Timer("Adding transits"):
             for i in range(0, len(data["exoplanets"])):
                 self.transit_list_widget.addTransit(data["exoplanets"][i], data)
-                self.update_info_data({'progress': 70 + 30 * (i / len(data["exoplanets"])), 'info': "Generating Plots"})
 
     def get_selected_date(self):
         return self.day_selector_widget.get_selected_date()
 
+    def get_selected_nights(self):
+        return self.day_selector_widget.get_selected_nights()
+
     def on_date_changed(self):
         self.parent_widget.on_date_changed()
 
@@ -67,8 +68,4 @@ class TransitSelectorWidget(QWidget):
         self.info_widget.update_data(data)
 
     def on_refresh_triggered(self):
-        self.day_selector_widget.set_enable_buttons(False)
-        self.transit_list_widget.clearTransits()
-
-    def on_refresh_completed(self):
-        self.day_selector_widget.set_enable_buttons(True)
\ No newline at end of file
+        self.transit_list_widget.clearTransits()
\ No newline at end of file